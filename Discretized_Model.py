@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import numpy as np
 import Helper_Functions as hf
+import Pixel_Labels as pl
 
 class DiscretizedModel:
     '''
@@ -8,6 +9,7 @@ class DiscretizedModel:
     Also contains functions to operate on images to generate tool paths.
     All images should be of the same system and the same resolution, in
     both width and height along with the length of a pixel in mm.
+    Images are single channel label images, see Pixel_Labels.
 
     Constructor Parameters:
         pixel_area (float): Describes the pixel's length and height in mm,
@@ -52,8 +54,8 @@ class DiscretizedModel:
             x = search_bounds[2]
             while x < search_bounds[3] or x < image_shape[1]:
                 current_pixel = self.images[image_indice][y][x]
-                if current_pixel[3] > 0 and self.check_in_circle(center, radius, (x, y)):
-                    self.images[image_indice][y][x][3] = 0
+                if current_pixel != pl.EMPTY and self.check_in_circle(center, radius, (x, y)):
+                    self.images[image_indice][y][x] = pl.EMPTY
 
                 x += 1
 
@@ -72,8 +74,8 @@ class DiscretizedModel:
             x = search_bounds[2]
             while x < search_bounds[3] or x < image_shape[1]:
                 current_pixel = self.images[image_indice][y][x]
-                if current_pixel[3] > 0 and self.check_in_capsule(center1, center2, radius, (x, y)):
-                    self.images[image_indice][y][x][3] = 0
+                if current_pixel != pl.EMPTY and self.check_in_capsule(center1, center2, radius, (x, y)):
+                    self.images[image_indice][y][x] = pl.EMPTY
 
                 x += 1
 
@@ -99,7 +101,7 @@ class DiscretizedModel:
             x = search_bounds[2]
             while x < search_bounds[3] or x < image_shape[1]:
                 current_pixel = self.images[image_indice][y][x]
-                if current_pixel[3] > 0 and current_pixel[2] == 255 and self.check_in_capsule(center1, center2, radius, (x, y)):
+                if current_pixel == pl.MODEL and self.check_in_capsule(center1, center2, radius, (x, y)):
                     material_counter["stock"] += 1
 
                 x += 1
@@ -3,6 +3,10 @@ import glm
 import numpy as np
 import stl
 import math
+import itertools
+import cv2
+
+import Pixel_Labels as pl
 
 def print_help():
     print("File, Depth of Cut, Tool Diameter (all units in mm).")
@@ -10,14 +14,30 @@ def print_help():
 def deg_to_rad(degrees):
     return (degrees * np.pi) / 180.0
 
-def load_shader(filepath):
+def load_shader(filepath, defines=None):
+    '''
+    Loads the source code of a shader. The pixel class codes from Pixel_Labels
+    are defined right after the #version directive as LABEL_<NAME>, so
+    shaders and host code share the same codes. Extra compile time
+    constants can be given as a dictionary of defines.
+    '''
     shader_file = open(filepath)
     with shader_file as file:
         shader = file.read()
 
     shader_file.close()
 
-    return shader
+    header = pl.shader_defines()
+    if defines is not None:
+        header += "".join(f"\n#define {name} {value}" for name, value in defines.items())
+
+    lines = shader.split("\n")
+    for i, line in enumerate(lines):
+        if line.strip().startswith("#version"):
+            lines.insert(i + 1, header)
+            break
+
+    return "\n".join(lines)
 
 def calculate_aspect_ratio(res_tuple):
     gcd = np.gcd(res_tuple[0], res_tuple[1])
@@ -77,6 +97,52 @@ def double_circle_bbox(center1, radius1: float, center2, radius2: float):
 
     return (top, bottom, left, right)
 
+def multi_circle_bbox(centers, radius: float):
+    '''
+    Takes an (N, 2) array of circle centers that share the same radius
+    and calculates a bounding box containing every circle. The box is
+    returned in the same order as double_circle_bbox.
+    '''
+    centers = np.asarray(centers).reshape(-1, 2)
+
+    top = math.ceil(np.max(centers[:, 1]) + radius)
+    bottom = math.floor(np.min(centers[:, 1]) - radius)
+    left = math.floor(np.min(centers[:, 0]) - radius)
+    right = math.ceil(np.max(centers[:, 0]) + radius)
+
+    return (top, bottom, left, right)
+
+def jump_flood_steps(radius):
+    '''
+    Lists the step sizes of the jump flood passes needed to find every
+    seed closer than radius pixels. Steps halve down to 1, followed by
+    an extra pass of 1 to fix most of the algorithm's errors.
+    '''
+    step = 1
+    while step * 2 <= radius:
+        step *= 2
+
+    steps = []
+    while step >= 1:
+        steps.append(step)
+        step //= 2
+
+    steps.append(1)
+    return steps
+
+def expand_edges(labels, radius):
+    '''
+    CPU version of the jump flood edge expansion. Every pixel of a label
+    array that is not model and lies closer than radius pixels to an
+    edge pixel becomes margin.
+    '''
+    not_edge = (labels != pl.EDGE).astype(np.uint8)
+    distance = cv2.distanceTransform(not_edge, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+    expanded = labels.copy()
+    expanded[(labels != pl.MODEL) & (distance < radius)] = pl.MARGIN
+    return expanded
+
 def check_point_in_circle(circ_center, radius, pixel_coord):
     pythag = (pixel_coord[0] - circ_center[0])**2 + (pixel_coord[1] - circ_center[1])**2
 
@@ -86,47 +152,48 @@ def check_point_in_circle(circ_center, radius, pixel_coord):
         return False
 
 def gen_test_gcode(array, retract_height):
-    if len(array) < 1:
+    '''
+    Writes the (Toolpath, height) layers generate_paths returns to
+    testGcode.ngc. Any iterable of layers works, such as Job.iter_paths,
+    and each layer is flushed to the file as soon as it is written.
+    '''
+    #The first layer is taken before the file is opened, so an empty
+    #iterable leaves an earlier testGcode.ngc untouched.
+    layers = iter(array)
+    first_layer = next(layers, None)
+    if first_layer is None:
         raise Exception("Location list is empty, no Gcode to output.")
 
     gcode_file = open("testGcode.ngc", "w")
 
     gcode_file.write(f"G21\nG0 Z{retract_height}\n")
 
-    for layer, height in array:
-        first_move = layer[0]
-        first_coords = []
-        print(first_move)
-        match first_move[0]:
-            case 0:
-                first_coords = first_move[1][0]
-            case 1:
-                first_coords = first_move[1]
-            case 2:
-                first_coords = first_move[1]
-            case _:
-                first_coords = []
-
-        if len(first_coords) < 2 or len(first_coords) > 2:
+    for toolpath, height in itertools.chain([first_layer], layers):
+        if len(toolpath) < 1:
             raise Exception("Malformed Paths Found in test_gcode")
 
+        first_move = toolpath.moves[0]
+        print(first_move)
+
         gcode_file.write(f"G0 Z{retract_height}\n")
-        gcode_file.write(f"G0 X{first_coords[0]} Y{first_coords[1]}\n")
-        
-        for link in layer:
+        gcode_file.write(f"G0 X{first_move['x']} Y{first_move['y']}\n")
+
+        for move_type, moves in toolpath.chains():
             gcode = ""
-            if link[0] == 0:
-                for coord in link[1]:
-                    gcode = f"G1 F600 X{coord[0]} Y{coord[1]} Z{height}\n"
+            if move_type == 0:
+                for move in moves:
+                    gcode = f"G1 F600 X{move['x']} Y{move['y']} Z{move['z']}\n"
                     gcode_file.write(gcode)
-            elif link[0] == 1:
-                coord = link[1]
-                gcode = f"G0 X{coord[0]} Y{coord[1]} Z{height}\n"
+            elif move_type == 1:
+                move = moves[-1]
+                gcode = f"G0 X{move['x']} Y{move['y']} Z{move['z']}\n"
                 gcode_file.write(gcode)
-            elif link[0] == 2:
-                coord = link[1]
-                gcode = f"G0 Z{retract_height}\nG0 X{coord[0]} Y{coord[1]}\nG0 Z{height}\n"
+            elif move_type == 2:
+                move = moves[-1]
+                gcode = f"G0 Z{retract_height}\nG0 X{move['x']} Y{move['y']}\nG0 Z{move['z']}\n"
                 gcode_file.write(gcode)
 
+        gcode_file.flush()
+
     gcode_file.write("M2\n")
     gcode_file.close()
@@ -1,10 +1,28 @@
 import multiprocessing
+import threading
+import collections
+import itertools
+import queue
+import os
+import contextlib
 import numpy as np
-from job import Job
+from job import Job, estimate_job_memory
+from cpuWorker import CPUWorker
+from bitplaneWorker import BitplaneWorker
+from computeWorker import ComputeWorker
+from Trace_Capture import TraceCapture
+import Pixel_Labels as pl
 
-def new_job_process(in_queue : multiprocessing.Queue,
-                    out_queue : multiprocessing.Queue):
-    job_data = in_queue.get(block=True)
+#Length and width of a pixel in mm every job is planned at.
+TARGET_RES = 0.2
+
+def run_job(job_data, send, ctx = None, worker = None):
+    '''
+    Plans a job sent by a client, handing every message for the client
+    to send. ctx is an OpenGL context to render the job with instead of
+    creating a new one, worker a ComputeWorker on that context the job
+    plans with when it uses the opengl backend.
+    '''
     job_name = job_data["job_name"]
     target_verts = np.array(job_data["target_verts"])
     target_normals = np.array(job_data["target_normals"])
@@ -13,46 +31,225 @@ def new_job_process(in_queue : multiprocessing.Queue,
     tool_diameter = job_data["tool_diameter"]
     depth_of_cut = job_data["depth_of_cut"]
     origin_point = np.array(job_data["origin_point"])
-    target_res = 0.2
+    backend = job_data.get("backend", "opengl")
+    search_strategy = job_data.get("search_strategy", "exhaustive")
+    trace_every = job_data.get("trace_every", 0)
+    planning_processes = job_data.get("processes", 1)
+    island_processes = job_data.get("island_processes", 1)
+    target_res = TARGET_RES
 
     new_job = Job(target_verts, stock_verts, [],
                   tool_diameter, target_res=target_res,
                   offset_coord=origin_point,
-                  debug=True)
+                  debug=True,
+                  backend=backend,
+                  search_strategy=search_strategy,
+                  trace=TraceCapture(every=trace_every),
+                  island_processes=island_processes,
+                  ctx=ctx,
+                  worker=worker if backend == "opengl" else None)
 
-    new_job.render_layers(depth_of_cut)
-    path_data = new_job.generate_paths(dist_inc=2.0, material_removal_ratio=0.4)
-    new_job.save_images()
     stock_height = new_job.bounds[-1]
     retract_height = 10 + stock_height
+    if planning_processes > 1:
+        new_job.render_layers(depth_of_cut)
+        path_data = new_job.generate_paths(dist_inc=2.0, material_removal_ratio=0.4,
+                                           processes=planning_processes)
+    else:
+        path_data = new_job.iter_paths(depth_of_cut, dist_inc=2.0,
+                                       material_removal_ratio=0.4)
+
+    #Every layer is sent back as soon as it is planned, a last message
+    #with finished set ends the job.
+    for toolpath, height in path_data:
+        print(f"Layer at {height}: {len(toolpath)} moves")
+        response_message = {"safe_retract": retract_height}
+        response_message['tool_paths'] = [[toolpath.to_dict(), height]]
+        response_message['job_name'] = job_name
+        response_message['finished'] = False
+        send(response_message)
+
+    new_job.save_images()
     response_message = {"safe_retract": retract_height}
-    response_data = []
-
-    for layer, height in path_data: 
-        layer_chains = []
-        for path_chain in layer:
-            match path_chain[0]:
-                case 0:
-                    cut_chain = []
-                    for cut_move in path_chain[1]:
-                        converted_chain = cut_move.tolist()
-                        cut_chain.append(converted_chain)
-                    layer_chains.append([0, cut_chain])
-                case 1:
-                    converted_chain = [1, path_chain[1].tolist()]
-                    layer_chains.append(converted_chain)
-                case 2:
-                    converted_chain = [2, path_chain[1].tolist()]
-                    layer_chains.append(converted_chain)
-                case _:
-                    pass
-
-        
-        response_data.append([layer_chains, height])
-        print(layer_chains[0])
-
-    response_message['tool_paths'] = response_data
+    response_message['tool_paths'] = []
     response_message['job_name'] = job_name
+    response_message['finished'] = True
+    send(response_message)
+
+def warm_up_worker(worker, warm_slice):
+    worker.load_slice(warm_slice, (32, 32))
+    worker.check_cut_fan(np.array([16.0, 16.0]), np.arange(0.0, 360.0, 90.0), 4.0, 2.0)
+    worker.make_cut(np.array([16.0, 16.0]), np.array([16.0, 20.0]), 2.0)
+    worker.count_pixels(worker.island_list[0])
+    worker.find_link_coords(worker.island_list[0])
+
+def warm_up():
+    '''
+    Runs the Numba kernels of the CPU engines once on a tiny slice, so
+    they are compiled before the first job arrives, and creates the
+    ComputeWorker every opengl job of the process plans with, its
+    context being the one jobs render with. Returns that worker, or None
+    when no context can be created.
+    '''
+    labels = np.full((32, 32), pl.STOCK, dtype='u1')
+    labels[12:20, 12:20] = pl.EMPTY
+    labels[0:4, 0:4] = pl.MODEL
+    warm_slice = (labels.tobytes(), labels.tobytes())
+    for worker_class in (CPUWorker, BitplaneWorker):
+        worker = worker_class(TARGET_RES, None, (32, 32), 4.0)
+        warm_up_worker(worker, warm_slice)
+        worker.release()
+
+    try:
+        worker = ComputeWorker(TARGET_RES, None, (32, 32), 4.0)
+    except Exception as error:
+        print(f"Jobs will create their own OpenGL context: {error}")
+        return None
+
+    warm_up_worker(worker, warm_slice)
+    return worker
+
+def job_worker(job_queue : multiprocessing.Queue,
+               result_queue : multiprocessing.Queue):
+    '''
+    Body of a JobPool process. Warms up once, then plans the jobs of
+    job_queue one after the other until it gets None, all of them on the
+    context and ComputeWorker of warm_up. Every message is put on
+    result_queue along with the id of its job, and a job that fails ends
+    with a finished message holding the error.
+    '''
+    worker = warm_up()
+    ctx = worker.ctx if worker is not None else None
+    while True:
+        job = job_queue.get(block=True)
+        if job is None:
+            break
+
+        (job_id, job_data) = job
+        def send(message):
+            result_queue.put((job_id, message))
+
+        try:
+            #The context has to be current for the whole job, whatever
+            #the previous job left current.
+            with ctx if ctx is not None else contextlib.nullcontext():
+                run_job(job_data, send, ctx, worker)
+        except Exception as error:
+            print(f"Job {job_id} failed: {error}")
+            send({"job_name": job_data.get("job_name"), "error": str(error),
+                  "finished": True})
+
+def physical_memory():
+    '''
+    Returns the bytes of physical memory of the host.
+    '''
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+class JobPool:
+    '''
+    A long lived pool of job processes for the server. The processes are
+    started and warmed up once, so jobs skip the imports, JIT compilation
+    and context creation a fresh process pays for.
+
+    Jobs wait in a queue of at most queue_size jobs until a process is
+    free and the GPU and host memory they are estimated to need, see
+    job.estimate_job_memory, fits next to the jobs already running.
+    Memory limits are given in bytes, host_memory defaults to half of
+    the physical memory. A job is rejected when the queue is full or when
+    it needs more memory than the limits allow on its own.
+    '''
+    def __init__(self, process_count = 2, queue_size = 32,
+                 gpu_memory = 2 * 1024**3, host_memory = None):
+        if host_memory is None:
+            host_memory = physical_memory() // 2
+
+        self.process_count = process_count
+        self.queue_size = queue_size
+        self.gpu_memory = gpu_memory
+        self.host_memory = host_memory
+
+        #Spawned, so the processes can start planning processes of their own.
+        mp_context = multiprocessing.get_context("spawn")
+        self.job_queue = mp_context.Queue()
+        self.result_queue = mp_context.Queue()
+        self.processes = [mp_context.Process(target=job_worker,
+                                             args=(self.job_queue, self.result_queue))
+                          for i in range(process_count)]
+        for process in self.processes:
+            process.start()
+
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count()
+        self.waiting = collections.deque()
+        self.running = {}
+        self.responses = {}
+        threading.Thread(target=self.route_results, daemon=True).start()
+
+    def submit(self, job_data):
+        '''
+        Queues a job. Returns a queue.Queue the job's messages arrive on,
+        the last one having finished set.
+        '''
+        memory = estimate_job_memory(np.array(job_data["stock_verts"]),
+                                     job_data["tool_diameter"], TARGET_RES,
+                                     job_data["depth_of_cut"],
+                                     job_data.get("processes", 1),
+                                     job_data.get("island_processes", 1))
+        if memory[0] > self.gpu_memory or memory[1] > self.host_memory:
+            raise Exception(f"Job needs {memory[0] // 1024**2}MB of GPU and "
+                            f"{memory[1] // 1024**2}MB of host memory, more than the server allows.")
+
+        responses = queue.Queue()
+        with self.lock:
+            if len(self.waiting) >= self.queue_size:
+                raise Exception("Job queue is full, try again later.")
+
+            job_id = next(self.job_ids)
+            self.responses[job_id] = responses
+            self.waiting.append((job_id, job_data, memory))
+            self.dispatch()
+
+        return responses
+
+    def dispatch(self):
+        '''
+        Hands waiting jobs to the processes, oldest first, while a process
+        is free and the next job fits in the memory left. Must be called
+        with the lock held.
+        '''
+        while self.waiting and len(self.running) < self.process_count:
+            (job_id, job_data, memory) = self.waiting[0]
+            gpu_used = sum(used[0] for used in self.running.values())
+            host_used = sum(used[1] for used in self.running.values())
+            if (gpu_used + memory[0] > self.gpu_memory or
+                host_used + memory[1] > self.host_memory):
+                break
+
+            self.waiting.popleft()
+            self.running[job_id] = memory
+            self.job_queue.put((job_id, job_data))
+
+    def route_results(self):
+        '''
+        Hands every message of the processes to its job's queue, starting
+        waiting jobs whenever a job finishes.
+        '''
+        while True:
+            (job_id, message) = self.result_queue.get(block=True)
+            with self.lock:
+                responses = self.responses[job_id]
+                if message.get("finished", True):
+                    del self.responses[job_id]
+                    del self.running[job_id]
+                    self.dispatch()
+
+            responses.put(message)
 
-    out_queue.put(response_message)
-    print(f"Ending Job Process")
+    def shutdown(self):
+        '''
+        Stops the processes once they are done with the jobs they got.
+        '''
+        for process in self.processes:
+            self.job_queue.put(None)
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import numpy as np
+from scipy.spatial import cKDTree
+
+class LinkIndex:
+    '''
+    A nearest neighbour index over link locations, given as the (N, 2)
+    array of (row, column) coordinates find_link_coords returns. They are
+    put in a KD-tree once, so finding the closest link location takes
+    logarithmic time instead of a scan of the whole image.
+
+    Rejected locations can be removed. They are only flagged and skipped
+    by queries, the tree is rebuilt once most of its points are gone.
+    '''
+    def __init__(self, link_coords):
+        self.build(np.asarray(link_coords).reshape(-1, 2))
+
+    def build(self, coords):
+        self.coords = coords
+        self.removed = np.zeros(len(coords), dtype=bool)
+        self.remaining = len(coords)
+        self.tree = cKDTree(coords) if len(coords) > 0 else None
+
+    def __len__(self):
+        return self.remaining
+
+    def nearest_index(self, location):
+        '''
+        Returns the index of the closest remaining link location to a
+        (row, column) location, or -1 if none remain.
+        '''
+        if self.remaining == 0:
+            return -1
+
+        k = 1
+        while True:
+            k = min(k, len(self.coords))
+            (distances, indices) = self.tree.query(location, k=k) #type: ignore
+            for index in np.atleast_1d(indices):
+                if not self.removed[index]:
+                    return int(index)
+
+            #Every point is checked once k reaches the size of the tree.
+            k *= 2
+
+    def nearest(self, location):
+        '''
+        Returns the (row, column) coordinates of the closest remaining
+        link location to a (row, column) location. Returns array [-1, -1]
+        if no link location remains.
+        '''
+        index = self.nearest_index(location)
+        if index < 0:
+            return np.array([-1, -1], dtype='f8')
+
+        return self.coords[index].astype('f8')
+
+    def remove(self, coords):
+        '''
+        Removes the link location at the given (row, column) coordinates.
+        '''
+        index = self.nearest_index(coords)
+        if index < 0 or np.any(self.coords[index] != coords):
+            return
+
+        self.removed[index] = True
+        self.remaining -= 1
+        if self.remaining < len(self.coords) // 2:
+            self.build(self.coords[~self.removed])
@@ -1,35 +1,7 @@
 import numpy as np
-from numba import jit
+from numba import jit, prange
 
-@jit(nopython=True)
-def search_link_points(link_points : np.ndarray, current_loc):
-    '''
-        Finds closest link point from shader image. Returns the X/Y coords
-        of the closest link point. Returns array [-1, -1] if no link point is
-        found
-        '''
-    bounds = np.array([link_points.shape[0], link_points.shape[1]])
-    closest_point = np.array([-1, -1], dtype='f8')
-
-    #Make default dist absurd for the math below, first dist should
-    #should always be smaller. Removes check every loop iteration.
-    current_distance = bounds[0] * bounds[1] * 1.2
-    for i in range(bounds[0]):
-        for j in range(bounds[1]):
-            current_pix = link_points[i][j]
-            is_link_loc = current_pix[3] > 250 and current_pix[1] > 250
-            if not is_link_loc:
-                continue
-
-            new_dif = np.array([i, j], dtype='f8') - current_loc
-            new_distance = np.hypot(new_dif[0], new_dif[1])
-            if new_distance > current_distance:
-                continue
-
-            closest_point = np.array([i, j], dtype='f8')
-            current_distance = new_distance
-
-    return closest_point
+from Pixel_Labels import EMPTY, MODEL, OBSTACLE, MARGIN, PROFILE, LINK
 
 @jit(nopython=True) #See: https://www.delftstack.com/howto/python/python-clamp/
 def clamp(n, smallest, largest):
@@ -75,3 +47,405 @@ def sort_rectangle_verts(vertices):
         i += 1
 
     return np.argsort(polar_rotations).astype('i4')
+
+@jit(nopython=True)
+def find_capsule_quads(center1, centers2, radius):
+    '''
+    Batched version of find_rectangle_points/sort_rectangle_verts. Takes
+    one starting center and an (N, 2) array of destination centers and
+    returns the rectangle vertices (N, 4, 2) and their sorted indices (N, 4)
+    for every candidate cut.
+    '''
+    count = centers2.shape[0]
+    quads = np.zeros((count, 4, 2), dtype=np.float32)
+    quad_indices = np.zeros((count, 4), dtype=np.int32)
+    for i in range(count):
+        quad = find_rectangle_points(center1, centers2[i], radius)
+        quads[i] = quad
+        quad_indices[i] = sort_rectangle_verts(quad)
+
+    return quads, quad_indices
+
+@jit(nopython=True)
+def point_in_circle(point, center, radius):
+    '''
+    Same test as isInsideCircle in the shaders, done in single precision
+    so the CPU kernels agree with the GPU on the border pixels.
+    '''
+    d0 = np.float32(point[0]) - np.float32(center[0])
+    d1 = np.float32(point[1]) - np.float32(center[1])
+    return d0 * d0 + d1 * d1 < np.float32(radius) * np.float32(radius)
+
+@jit(nopython=True)
+def quad_edge(p0, p1, v1, v2):
+    '''
+    Which side of the quad edge from v1 to v2 a point is on, negative
+    being outside. Takes the point as single precision p0 and p1.
+    '''
+    return (v2[0] - v1[0]) * (p1 - v1[1]) - (p0 - v1[0]) * (v2[1] - v1[1])
+
+@jit(nopython=True)
+def point_in_quad(point, quad, quad_indices):
+    '''
+    Same test as isInsideQuad in the shaders.
+    '''
+    p0 = np.float32(point[0])
+    p1 = np.float32(point[1])
+    for i in range(4):
+        v1 = quad[quad_indices[i]]
+        v2 = quad[quad_indices[(i + 1) % 4]]
+        if quad_edge(p0, p1, v1, v2) < 0:
+            return False
+
+    return True
+
+@jit(nopython=True)
+def count_cut_region(labels, viewport, center1, center2, radius,
+                     quad, quad_indices, treat_green_as_red):
+    '''
+    CPU version of count_colors.glsl for a single cut. Only the pixels in
+    the viewport (x, y, width, height) are visited.
+    '''
+    counters = np.zeros(4, dtype=np.uint32)
+    for y in range(viewport[1], viewport[1] + viewport[3]):
+        for x in range(viewport[0], viewport[0] + viewport[2]):
+            point = (y, x)
+            if point_in_circle(point, center1, radius):
+                continue
+            if not (point_in_quad(point, quad, quad_indices)
+                    or point_in_circle(point, center2, radius)):
+                continue
+
+            label = labels[y, x]
+            if label == EMPTY:
+                counters[3] += 1
+            elif label == MODEL:
+                counters[0] += 1
+            elif label == OBSTACLE:
+                counters[1] += 1
+            elif treat_green_as_red and (label == MARGIN or label == PROFILE or label == LINK):
+                counters[1] += 1
+            else:
+                counters[2] += 1
+
+    return counters
+
+@jit(nopython=True, parallel=True)
+def count_cuts(labels, viewports, center1, centers2, radius,
+               quads, quad_indices, treat_green_as_red):
+    '''
+    Counts every candidate cut in parallel, each one only inside of its
+    own viewport. Returns an (N, 4) array of counters.
+    '''
+    count = centers2.shape[0]
+    counters = np.zeros((count, 4), dtype=np.uint32)
+    for i in prange(count):
+        counters[i] = count_cut_region(labels, viewports[i], center1, centers2[i],
+                                       radius, quads[i], quad_indices[i],
+                                       treat_green_as_red)
+
+    return counters
+
+@jit(nopython=True, parallel=True)
+def cut_capsule(labels, viewport, center1, center2, radius, quad, quad_indices):
+    '''
+    CPU version of cut_capsule.glsl. Empties every pixel of the label
+    array inside of the cut, only visiting the given viewport.
+    '''
+    for j in prange(viewport[3]):
+        y = viewport[1] + j
+        for x in range(viewport[0], viewport[0] + viewport[2]):
+            point = (y, x)
+            if (point_in_circle(point, center1, radius)
+                or point_in_circle(point, center2, radius)
+                or point_in_quad(point, quad, quad_indices)):
+                labels[y, x] = EMPTY
+
+@jit(nopython=True)
+def solid_in_circle(labels, mask, mask_origin, center, radius, use_mask, ignore_margin):
+    '''
+    Looks for a solid pixel inside of a circle, as the searches in
+    find_link_locs.glsl do. Pixels outside of the image count as empty.
+    mask is an island mask cropped to its bounding box, whose lowest
+    (row, column) is mask_origin.
+    '''
+    height, width = labels.shape
+    left = max(int(np.floor(center[1] - radius)), 0)
+    right = min(int(np.ceil(center[1] + radius)), width - 1)
+    bottom = max(int(np.floor(center[0] - radius)), 0)
+    top = min(int(np.ceil(center[0] + radius)), height - 1)
+    for y in range(bottom, top + 1):
+        for x in range(left, right + 1):
+            label = labels[y, x]
+            if label == EMPTY:
+                continue
+            if use_mask:
+                mask_y = y - mask_origin[0]
+                mask_x = x - mask_origin[1]
+                if (mask_y < 0 or mask_y >= mask.shape[0]
+                    or mask_x < 0 or mask_x >= mask.shape[1]):
+                    continue
+                if mask[mask_y, mask_x] < 230:
+                    continue
+            if ignore_margin and (label == MARGIN or label == PROFILE or label == LINK):
+                continue
+            if point_in_circle((x, y), (center[1], center[0]), radius):
+                return True
+
+    return False
+
+@jit(nopython=True, parallel=True)
+def find_link_pixels(labels, mask, mask_origin, radius, ignore_margin):
+    '''
+    CPU version of find_link_locs.glsl. Returns the same label image, LINK
+    pixels mark link locations. mask is cropped as in solid_in_circle.
+    '''
+    height, width = labels.shape
+    link_image = np.full((height, width), EMPTY, dtype=np.uint8)
+    proximity = 1.5
+    for y in prange(height):
+        for x in range(width):
+            if labels[y, x] != EMPTY:
+                continue
+
+            if solid_in_circle(labels, mask, mask_origin, (y, x), radius, False, False):
+                continue
+            if solid_in_circle(labels, mask, mask_origin, (y, x), radius + proximity,
+                               True, ignore_margin):
+                link_image[y, x] = LINK
+
+    return link_image
+
+#Bitplanes pack 32 pixels of a row into each uint32 word, pixel x of a
+#row being bit (x % 32) of word (x // 32).
+PLANE_MODEL = 0
+PLANE_OBSTACLE = 1
+PLANE_SOLID = 2
+
+@jit(nopython=True, parallel=True)
+def pack_label_planes(labels, treat_green_as_red):
+    '''
+    Packs a label array into model, obstacle and solid (anything not
+    empty) bitplanes, returned as a (3, height, words per row) array.
+    '''
+    height, width = labels.shape
+    words = (width + 31) // 32
+    planes = np.zeros((3, height, words), dtype=np.uint32)
+    for y in prange(height):
+        for x in range(width):
+            label = labels[y, x]
+            if label == EMPTY:
+                continue
+
+            bit = np.uint32(1) << np.uint32(x & 31)
+            w = x >> 5
+            planes[PLANE_SOLID, y, w] |= bit
+            if label == MODEL:
+                planes[PLANE_MODEL, y, w] |= bit
+            elif label == OBSTACLE:
+                planes[PLANE_OBSTACLE, y, w] |= bit
+            elif treat_green_as_red and (label == MARGIN or label == PROFILE or label == LINK):
+                planes[PLANE_OBSTACLE, y, w] |= bit
+
+    return planes
+
+@jit(nopython=True)
+def popcount32(v):
+    '''
+    Counts the set bits of a 32 bit word.
+    '''
+    v = v - ((v >> np.uint32(1)) & np.uint32(0x55555555))
+    v = (v & np.uint32(0x33333333)) + ((v >> np.uint32(2)) & np.uint32(0x33333333))
+    v = (v + (v >> np.uint32(4))) & np.uint32(0x0F0F0F0F)
+    return ((v * np.uint32(0x01010101)) & np.uint32(0xFFFFFFFF)) >> np.uint32(24)
+
+@jit(nopython=True)
+def circle_row_span(y, center, radius, x_min, x_max):
+    '''
+    Returns the first and last column of row y between x_min and x_max
+    inside of a circle, by the test of point_in_circle. The chord gives
+    the span, which is then moved pixel by pixel until it agrees with
+    point_in_circle on both ends. Empty spans have first > last.
+    '''
+    dy = np.float32(y) - np.float32(center[0])
+    rest = np.float32(radius) * np.float32(radius) - dy * dy
+    half = np.sqrt(rest) if rest > 0 else 0.0
+    #The test only gets harder further from the center, so a row that
+    #has a pixel inside has one at the center column rounded up.
+    limit = min(max(int(np.ceil(center[1])), x_min), x_max)
+    first = int(clamp(np.ceil(center[1] - half), x_min, limit))
+    while first > x_min and point_in_circle((y, first - 1), center, radius):
+        first -= 1
+    while first <= limit and not point_in_circle((y, first), center, radius):
+        first += 1
+    if first > limit:
+        return 1, 0
+
+    last = int(clamp(np.floor(center[1] + half), first, x_max))
+    while last < x_max and point_in_circle((y, last + 1), center, radius):
+        last += 1
+    while not point_in_circle((y, last), center, radius):
+        last -= 1
+
+    return first, last
+
+@jit(nopython=True)
+def quad_row_span(y, quad, quad_indices, x_min, x_max):
+    '''
+    Returns the first and last column of row y between x_min and x_max
+    inside of a quad, by the test of point_in_quad. Along a row every
+    edge only bounds the span from one side, where it crosses the row,
+    and that crossing is moved pixel by pixel until it agrees with
+    quad_edge. Empty spans have first > last.
+    '''
+    p0 = np.float32(y)
+    first = x_min
+    last = x_max
+    for i in range(4):
+        v1 = quad[quad_indices[i]]
+        v2 = quad[quad_indices[(i + 1) % 4]]
+        slope = v2[0] - v1[0]
+        if slope == 0:
+            #Parallel to the row, the whole row is on one side.
+            if quad_edge(p0, np.float32(first), v1, v2) < 0:
+                return 1, 0
+            continue
+
+        crossing = v1[1] + (p0 - v1[0]) * (v2[1] - v1[1]) / slope
+        if slope > 0:
+            x = int(clamp(np.ceil(crossing), first, last + 1))
+            while x > first and quad_edge(p0, np.float32(x - 1), v1, v2) >= 0:
+                x -= 1
+            while x <= last and quad_edge(p0, np.float32(x), v1, v2) < 0:
+                x += 1
+            first = x
+        else:
+            x = int(clamp(np.floor(crossing), first - 1, last))
+            while x < last and quad_edge(p0, np.float32(x + 1), v1, v2) >= 0:
+                x += 1
+            while x >= first and quad_edge(p0, np.float32(x), v1, v2) < 0:
+                x -= 1
+            last = x
+
+        if first > last:
+            return 1, 0
+
+    return first, last
+
+@jit(nopython=True)
+def span_word(first, last, w):
+    '''
+    Returns the bits of word w covered by the columns first to last.
+    '''
+    first = max(first, w * 32)
+    last = min(last, w * 32 + 31)
+    if first > last:
+        return np.uint32(0)
+
+    bits = (np.uint64(0xFFFFFFFF) >> np.uint64(31 - (last - first))) << np.uint64(first & 31)
+    return np.uint32(bits & np.uint64(0xFFFFFFFF))
+
+@jit(nopython=True)
+def capsule_row_spans(y, viewport, center1, center2, radius, quad, quad_indices):
+    '''
+    Returns the spans of row y inside of the start circle, the quad and
+    the end circle of a cut, clipped to its viewport, as a (3, 2) array.
+    '''
+    x_min = viewport[0]
+    x_max = viewport[0] + viewport[2] - 1
+    spans = np.empty((3, 2), dtype=np.int64)
+    spans[0] = circle_row_span(y, center1, radius, x_min, x_max)
+    spans[1] = quad_row_span(y, quad, quad_indices, x_min, x_max)
+    spans[2] = circle_row_span(y, center2, radius, x_min, x_max)
+    return spans
+
+@jit(nopython=True)
+def spans_extent(spans):
+    '''
+    Returns the first and last column covered by any of the spans, with
+    last below 0 when all of them are empty.
+    '''
+    first = np.iinfo(np.int64).max
+    last = -1
+    for k in range(spans.shape[0]):
+        if spans[k, 0] <= spans[k, 1]:
+            first = min(first, spans[k, 0])
+            last = max(last, spans[k, 1])
+
+    return first, last
+
+@jit(nopython=True, parallel=True)
+def count_cuts_bitplanes(planes, viewports, center1, centers2, radius,
+                         quads, quad_indices):
+    '''
+    Bitplane version of count_cuts. The spans of the cut are found once
+    per row, each word of its mask is then built from them with shifts,
+    ANDed with the planes and popcounted, giving the same (N, 4)
+    counters.
+    '''
+    count = centers2.shape[0]
+    counters = np.zeros((count, 4), dtype=np.uint32)
+    for i in prange(count):
+        viewport = viewports[i]
+        if viewport[2] == 0 or viewport[3] == 0:
+            continue
+
+        model = 0
+        obstacle = 0
+        solid = 0
+        region = 0
+        for y in range(viewport[1], viewport[1] + viewport[3]):
+            spans = capsule_row_spans(y, viewport, center1, centers2[i], radius,
+                                      quads[i], quad_indices[i])
+            #Only the quad and the end circle are counted.
+            (first, last) = spans_extent(spans[1:])
+            for w in range(first >> 5, (last >> 5) + 1):
+                mask = ((span_word(spans[1, 0], spans[1, 1], w) |
+                         span_word(spans[2, 0], spans[2, 1], w)) &
+                        ~span_word(spans[0, 0], spans[0, 1], w))
+                if mask == 0:
+                    continue
+
+                region += popcount32(mask)
+                solid += popcount32(mask & planes[PLANE_SOLID, y, w])
+                model += popcount32(mask & planes[PLANE_MODEL, y, w])
+                obstacle += popcount32(mask & planes[PLANE_OBSTACLE, y, w])
+
+        counters[i, 0] = model
+        counters[i, 1] = obstacle
+        counters[i, 2] = solid - model - obstacle
+        counters[i, 3] = region - solid
+
+    return counters
+
+@jit(nopython=True, parallel=True)
+def cut_capsule_bitplanes(planes, viewport, center1, center2, radius,
+                          quad, quad_indices):
+    '''
+    Bitplane version of cut_capsule. Clears the whole capsule of the cut
+    from every plane, the label array is left to sync_label_planes.
+    '''
+    for j in prange(viewport[3]):
+        y = viewport[1] + j
+        spans = capsule_row_spans(y, viewport, center1, center2, radius,
+                                  quad, quad_indices)
+        (first, last) = spans_extent(spans)
+        for w in range(first >> 5, (last >> 5) + 1):
+            mask = (span_word(spans[0, 0], spans[0, 1], w) |
+                    span_word(spans[1, 0], spans[1, 1], w) |
+                    span_word(spans[2, 0], spans[2, 1], w))
+            for p in range(planes.shape[0]):
+                planes[p, y, w] &= ~mask
+
+@jit(nopython=True, parallel=True)
+def sync_label_planes(planes, labels, viewport):
+    '''
+    Empties every pixel of the label array inside of the viewport that
+    was cut from the solid plane.
+    '''
+    for j in prange(viewport[3]):
+        y = viewport[1] + j
+        for x in range(viewport[0], viewport[0] + viewport[2]):
+            bit = np.uint32(1) << np.uint32(x & 31)
+            if not planes[PLANE_SOLID, y, x >> 5] & bit:
+                labels[y, x] = EMPTY
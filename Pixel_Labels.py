@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import numpy as np
+
+#Class codes for single channel label images of an additive slice. Every
+#pixel of a slice holds exactly one of these codes.
+EMPTY = 0     #No material, the tool can move freely here.
+STOCK = 1     #Stock material still to be cut.
+MODEL = 2     #Target model material, must never be cut.
+OBSTACLE = 3  #Obstacles such as fixtures, must never be cut.
+EDGE = 4      #Border pixels of the target model found by edge detection.
+MARGIN = 5    #Expanded edge around the model, a tool radius wide.
+PROFILE = 6   #Final profile pixels of a stock island.
+LINK = 7      #Locations the tool can link to.
+
+LABEL_NAMES = ("EMPTY", "STOCK", "MODEL", "OBSTACLE",
+               "EDGE", "MARGIN", "PROFILE", "LINK")
+
+#RGBA colors used to display each class, indexed by class code.
+PALETTE = np.array([
+    [0, 0, 0, 0],
+    [0, 0, 0, 255],
+    [0, 0, 255, 255],
+    [255, 0, 0, 255],
+    [255, 128, 0, 255],
+    [0, 255, 0, 255],
+    [255, 255, 0, 255],
+    [0, 255, 0, 255],
+], dtype='u1')
+
+def labels_to_rgba(labels):
+    '''
+    Converts a label array into an RGBA image for saving or viewing.
+    '''
+    return PALETTE[labels]
+
+def shader_defines():
+    '''
+    Returns the GLSL #define lines for every class code, LABEL_<NAME>.
+    '''
+    return "\n".join(f"#define LABEL_{name} {code}u" for code, name in enumerate(LABEL_NAMES))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import numpy as np
+
+#Move types of a toolpath.
+CUT = 0      #Feed move cutting material.
+LINK = 1     #Rapid move at the cutting height, clear of any material.
+RETRACT = 2  #Rapid move that retracts, moves over and plunges back down.
+
+MOVE_DTYPE = np.dtype([
+    ('move_type', 'u1'),
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('z', 'f8'),
+])
+
+class Toolpath:
+    '''
+    A growable, compact list of tool moves. Moves are stored in a single
+    structured array of (move_type, x, y, z) that doubles its capacity
+    when full, so appending is amortized O(1). Moves are grouped into
+    chains, runs of moves of the same type, and the index each chain
+    starts at is kept in a second growable array.
+
+    A cutting chain holds every point the tool feeds through, link and
+    retract chains hold the single point they move to.
+    '''
+    def __init__(self, capacity = 64):
+        self.moves = np.zeros(max(capacity, 1), dtype=MOVE_DTYPE)
+        self.size = 0
+        self.chain_starts = np.zeros(8, dtype=np.int64)
+        self.chain_count = 0
+        self.chain_type = CUT
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, count):
+        '''
+        Makes sure count more moves fit without growing the move array.
+        '''
+        needed = self.size + count
+        if needed <= len(self.moves):
+            return
+
+        capacity = max(needed, len(self.moves) * 2)
+        moves = np.zeros(capacity, dtype=MOVE_DTYPE)
+        moves[:self.size] = self.moves[:self.size]
+        self.moves = moves
+
+    def start_chain(self, move_type):
+        '''
+        Starts a new chain of moves of the given type. Following appends
+        belong to it.
+        '''
+        if self.chain_count == len(self.chain_starts):
+            chain_starts = np.zeros(self.chain_count * 2, dtype=np.int64)
+            chain_starts[:self.chain_count] = self.chain_starts
+            self.chain_starts = chain_starts
+
+        self.chain_starts[self.chain_count] = self.size
+        self.chain_count += 1
+        self.chain_type = move_type
+
+    def append(self, point, z):
+        '''
+        Appends a move to an (x, y) point at height z to the current chain.
+        '''
+        if self.chain_count == 0:
+            raise Exception("A chain has to be started before appending moves.")
+
+        self.reserve(1)
+        self.moves[self.size] = (self.chain_type, point[0], point[1], z)
+        self.size += 1
+
+    def add_chain(self, move_type, points, z):
+        '''
+        Adds a whole chain of moves through an (N, 2) array of points.
+        '''
+        points = np.asarray(points, dtype='f8').reshape(-1, 2)
+        self.start_chain(move_type)
+        self.reserve(len(points))
+        new_moves = self.moves[self.size:self.size + len(points)]
+        new_moves['move_type'] = move_type
+        new_moves['x'] = points[:, 0]
+        new_moves['y'] = points[:, 1]
+        new_moves['z'] = z
+        self.size += len(points)
+
+    def extend(self, other, first_chain_type = None):
+        '''
+        Appends every chain of another toolpath. When first_chain_type is
+        given it replaces the move type of the first appended chain.
+        '''
+        for i, (move_type, moves) in enumerate(other.chains()):
+            if i == 0 and first_chain_type is not None:
+                move_type = first_chain_type
+            self.add_chain(move_type, np.column_stack((moves['x'], moves['y'])),
+                           moves['z'])
+
+    def last_point(self):
+        '''
+        Returns the (x, y) point of the last move.
+        '''
+        if self.size == 0:
+            raise Exception("Toolpath has no moves.")
+
+        last_move = self.moves[self.size - 1]
+        return np.array([last_move['x'], last_move['y']])
+
+    def chains(self):
+        '''
+        Yields every non-empty chain as a tuple of its move type and its
+        moves, a view into the move array.
+        '''
+        ends = np.append(self.chain_starts[1:self.chain_count], self.size)
+        for start, end in zip(self.chain_starts[:self.chain_count], ends):
+            if end > start:
+                yield int(self.moves[start]['move_type']), self.moves[start:end]
+
+    def to_dict(self):
+        '''
+        Returns the toolpath as a dictionary of lists that can be
+        serialized to JSON.
+        '''
+        moves = self.moves[:self.size]
+        return {
+            "move_types": moves['move_type'].tolist(),
+            "points": np.column_stack((moves['x'], moves['y'], moves['z'])).tolist(),
+            "chain_starts": self.chain_starts[:self.chain_count].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Rebuilds a toolpath from the dictionary to_dict returns.
+        '''
+        move_types = np.asarray(data["move_types"], dtype='u1')
+        points = np.asarray(data["points"], dtype='f8').reshape(-1, 3)
+        toolpath = cls(len(move_types))
+        toolpath.moves[:len(move_types)]['move_type'] = move_types
+        toolpath.moves[:len(move_types)]['x'] = points[:, 0]
+        toolpath.moves[:len(move_types)]['y'] = points[:, 1]
+        toolpath.moves[:len(move_types)]['z'] = points[:, 2]
+        toolpath.size = len(move_types)
+
+        chain_starts = np.asarray(data["chain_starts"], dtype=np.int64)
+        toolpath.chain_starts = np.zeros(max(len(chain_starts), 8), dtype=np.int64)
+        toolpath.chain_starts[:len(chain_starts)] = chain_starts
+        toolpath.chain_count = len(chain_starts)
+        if toolpath.size > 0:
+            toolpath.chain_type = int(move_types[-1])
+        return toolpath
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import os
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+TRACE_FORMATS = ("png", "npz")
+
+class TraceCapture:
+    '''
+    Debug trace of the working slice while paths are planned. Disabled
+    unless every is above 0, in which case every Nth step of each named
+    trace is sampled into a ring buffer holding the last capacity frames,
+    older frames get dropped. Frames are only encoded and written to
+    out_dir, as PNG images or compressed NPZ arrays, when the buffer is
+    flushed, and the encoding runs on a small thread pool so the planner
+    does not wait on it.
+    '''
+    def __init__(self, every = 0, capacity = 64, out_dir = "./renders",
+                 fmt = "png", threads = 2):
+        if fmt not in TRACE_FORMATS:
+            raise Exception(f"Unknown trace format {fmt}, expected one of {list(TRACE_FORMATS)}")
+
+        self.every = every
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.threads = threads
+        self.frames = collections.deque(maxlen=max(capacity, 1))
+        self.pending = []
+        self.executor = None
+
+    @property
+    def enabled(self):
+        return self.every > 0
+
+    def capture(self, name, step, retrieve_image):
+        '''
+        Samples a frame of the named trace when step is a multiple of
+        every. retrieve_image is only called for sampled steps, so a
+        disabled trace never reads the slice back.
+        '''
+        if not self.enabled or step % self.every != 0:
+            return
+
+        self.frames.append((name, step, retrieve_image()))
+
+    def flush(self):
+        '''
+        Hands every buffered frame to the thread pool to be encoded, then
+        empties the buffer.
+        '''
+        if len(self.frames) == 0:
+            return
+
+        if self.executor is None:
+            if not os.path.exists(self.out_dir):
+                os.makedirs(self.out_dir)
+            self.executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        self.pending = [future for future in self.pending if not future.done()]
+        while self.frames:
+            (name, step, image) = self.frames.popleft()
+            self.pending.append(self.executor.submit(self.encode, name, step, image))
+
+    def encode(self, name, step, image):
+        path = os.path.join(self.out_dir, f"{name}{step:08d}.{self.fmt}")
+        if self.fmt == "png":
+            Image.fromarray(image).save(path)
+        else:
+            np.savez_compressed(path, image=image)
+
+    def close(self):
+        '''
+        Flushes the buffer and waits for every frame to be written.
+        '''
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+        for future in self.pending:
+            future.result()
+        self.pending = []
@@ -0,0 +1,102 @@
+import sys
+import time
+import numpy as np
+
+from cpuWorker import CPUWorker
+import Helper_Functions as hf
+import Pixel_Labels as pl
+
+#Times the counting shaders of ComputeWorker, count_colors through
+#check_cut, count_colors_batched through check_cuts and
+#count_image_total through count_pixels, next to CPUWorker, at every
+#slice resolution given (square, in pixels). The shaders are timed twice,
+#with their workgroup counters and built with GLOBAL_ATOMICS, the per
+#pixel atomics on the SSBO they used before, as the baseline.
+#Usage: python bench_counting.py [resolution ...]
+
+RESOLUTIONS = [512, 1024, 2048, 4096]
+REPEATS = 5
+DIRECTIONS = np.arange(0.0, 360.0, 2.0)
+
+def bench_slice(res):
+    labels = np.full((res, res), pl.STOCK, dtype='u1')
+    labels[res // 4:res // 2, res // 4:res // 2] = pl.MODEL
+    labels[res // 2:, res // 2:] = pl.EMPTY
+    return (labels.tobytes(), labels.tobytes())
+
+def time_call(function):
+    #The first call compiles kernels and allocates buffers.
+    function()
+    start = time.perf_counter()
+    for i in range(REPEATS):
+        function()
+    return (time.perf_counter() - start) / REPEATS
+
+def bench_worker(worker, res):
+    center = np.array([res / 2, res / 2])
+    radius = res / 40
+    distance = radius / 2
+    thetas = np.radians(DIRECTIONS)
+    destinations = center + np.column_stack((np.sin(thetas), np.cos(thetas))) * distance
+    island = worker.island_list[0]
+
+    return (time_call(lambda: worker.check_cut(center, destinations[0], radius)),
+            time_call(lambda: worker.check_cuts(center, destinations, radius)),
+            time_call(lambda: worker.count_pixels()),
+            time_call(lambda: worker.count_pixels(island)))
+
+def baseline_programs(worker):
+    '''
+    Returns the counting programs of a ComputeWorker built with
+    GLOBAL_ATOMICS, in the order of its counter_compute,
+    batch_counter_compute and image_counter_compute.
+    '''
+    defines = {"GLOBAL_ATOMICS": 1}
+    programs = [worker.ctx.compute_shader(hf.load_shader(path, defines))
+                for path in ("./shaders/count_colors.glsl",
+                             "./shaders/count_colors_batched.glsl",
+                             "./shaders/count_image_total.glsl")]
+    programs[0]['imageSlice'] = 1
+    programs[1]['imageSlice'] = 1
+    programs[2]['imageSlice'] = 5
+    programs[2]['mask'] = 7
+    return programs
+
+def swap_programs(worker, programs):
+    '''
+    Sets the counting programs of a ComputeWorker, returning the ones it
+    had.
+    '''
+    previous = [worker.counter_compute, worker.batch_counter_compute,
+                worker.image_counter_compute]
+    (worker.counter_compute, worker.batch_counter_compute,
+     worker.image_counter_compute) = programs
+    return previous
+
+if __name__ == "__main__":
+    resolutions = [int(arg) for arg in sys.argv[1:]] or RESOLUTIONS
+
+    try:
+        from computeWorker import ComputeWorker
+        gpu = ComputeWorker(0.1, None, (resolutions[0], resolutions[0]), 4.0)
+        with gpu.ctx:
+            baseline = baseline_programs(gpu)
+    except Exception as error:
+        print(f"Skipping, no OpenGL context can be created: {error}")
+        sys.exit()
+
+    print(f"{'engine':<18}{'res':>6}{'check_cut':>12}{'check_cuts':>12}"
+          f"{'count':>12}{'count isl':>12}")
+    for res in resolutions:
+        images = bench_slice(res)
+        gpu.load_slice(images, (res, res))
+        cpu = CPUWorker(0.1, images, (res, res), 4.0)
+        results = [("ComputeWorker", bench_worker(gpu, res))]
+        current = swap_programs(gpu, baseline)
+        results.append(("global atomics", bench_worker(gpu, res)))
+        swap_programs(gpu, current)
+        results.append(("CPUWorker", bench_worker(cpu, res)))
+        for name, timings in results:
+            print(f"{name:<18}{res:>6}" + "".join(f"{t * 1000:>10.3f}ms" for t in timings))
+
+    gpu.release()
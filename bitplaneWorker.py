@@ -0,0 +1,88 @@
+from typing import Tuple
+import numpy as np
+
+import NumbaAccelerated as na
+from cpuWorker import CPUWorker
+
+class BitplaneWorker(CPUWorker):
+    '''
+    A CPU engagement engine that answers cut checks from bitplanes of the
+    slice instead of its labels. Every plane packs 32 pixels into a
+    single uint32, so a cut is counted by ANDing a mask of it with the
+    planes and popcounting the result. The mask of a row is built from
+    the spans the cut covers on it, a handful of shifts per word. The
+    three planes take 3 bits a pixel instead of the byte of a label, so
+    large, fine resolution slices stay in cache while the planner fans
+    out its cuts.
+
+    Cuts only clear the planes. The label array is still kept for the
+    rarer whole image operations, pixel counting, link searches and
+    image retrieval, and the cuts are only copied over to it, from the
+    planes, when it is next read. This shrinks the work of a cut, not
+    the memory of the slice.
+
+    Takes the same parameters as CPUWorker.
+    '''
+    def __init__(self,
+            pixel_res: float,
+            target_images: Tuple[bytes, bytes],
+            img_res,
+            diameter,
+            treat_green_as_red = False,
+            ):
+        self.dirty_bbox = None
+        super().__init__(pixel_res, target_images, img_res, diameter,
+                         treat_green_as_red)
+
+    @property
+    def labels(self):
+        if self.dirty_bbox is not None:
+            (x0, y0, x1, y1) = self.dirty_bbox
+            na.sync_label_planes(self.planes, self._labels,
+                                 np.array([x0, y0, x1 - x0, y1 - y0]))
+            self.dirty_bbox = None
+        return self._labels
+
+    @labels.setter
+    def labels(self, labels):
+        self._labels = labels
+        self.dirty_bbox = None
+
+    def load_slice(self, target_images: Tuple[bytes, bytes], img_res = None):
+        super().load_slice(target_images, img_res)
+        self.planes = na.pack_label_planes(self.labels, self.treat_green_as_red)
+
+    def check_cuts(self, center1, centers2, radius):
+        center1 = np.asarray(center1, dtype='f8')
+        centers2 = np.asarray(centers2, dtype='f8').reshape(-1, 2)
+        candidate_count = centers2.shape[0]
+
+        viewports = np.zeros((candidate_count, 4), dtype=np.int64)
+        for i in range(candidate_count):
+            viewport = self.cut_viewport(center1, centers2[i], radius)
+            if viewport is not None:
+                viewports[i] = viewport
+
+        quads, quad_indices = na.find_capsule_quads(center1, centers2, radius) #type: ignore
+        return na.count_cuts_bitplanes(self.planes, viewports, center1, centers2,
+                                       radius, quads, quad_indices)
+
+    def make_cut(self, center1, center2, radius):
+        center1 = np.asarray(center1, dtype='f8')
+        center2 = np.asarray(center2, dtype='f8')
+        viewport = self.cut_viewport(center1, center2, radius)
+        if viewport is None:
+            return
+
+        quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
+        sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
+        na.cut_capsule_bitplanes(self.planes, np.array(viewport),
+                                 center1, center2, radius, quad, sorted_quad_indices)
+
+        #Grow the region of the labels that is behind the planes.
+        (x, y, w, h) = viewport
+        if self.dirty_bbox is None:
+            self.dirty_bbox = (x, y, x + w, y + h)
+        else:
+            (x0, y0, x1, y1) = self.dirty_bbox
+            self.dirty_bbox = (min(x0, x), min(y0, y), max(x1, x + w), max(y1, y + h))
@@ -2,14 +2,26 @@
 from typing import Tuple
 import Helper_Functions as hf
 import moderngl
+import math
 import numpy as np
-from PIL import Image
-import cv2
-import sys
 
 import NumbaAccelerated as na
-
-class ComputeWorker:
+import Pixel_Labels as pl
+from engagementWorker import EngagementWorker
+
+#Layout of a single candidate cut in the batched counter shader's SSBO (std430).
+CANDIDATE_DTYPE = np.dtype([
+    ('circleCenters', '<f4', (4,)),
+    ('quadPoints', '<f4', (4, 2)),
+    ('quadIndices', '<i4', (4,)),
+])
+
+#Workgroup width and height of the tiled neighbourhood search shaders.
+TILE_SIZE = 16
+#Shared memory every GL 4.3 implementation has to offer a workgroup.
+MIN_SHARED_MEMORY_SIZE = 32768
+
+class ComputeWorker(EngagementWorker):
     '''
     A class to represent a worker process/thread. Should be able to take
     and image and 
@@ -20,11 +32,14 @@ class ComputeWorker:
             img_res,
             diameter,
             ):
-        self.pixel_res = pixel_res
+        '''
+        Creates the context and compiles every program once. The worker
+        can then be pointed at any amount of slices with load_slice,
+        target_images may be None to load the first slice later.
+        '''
+        super().__init__(pixel_res, img_res, diameter)
         self.ctx = moderngl.create_standalone_context()
         self.ctx.enable(moderngl.DEPTH_TEST)
-        self.image_res = img_res
-        self.tool_diameter = diameter
 
         #Setup buffers and program/vao for stock island detection.
         self.image_vertices = np.array([
@@ -33,7 +48,8 @@ class ComputeWorker:
             1, 1,
             1, -1,
         ], dtype='f4')
-        imageVerts_vbo = self.ctx.buffer(self.image_vertices)
+        self.imageVerts_vbo = self.ctx.buffer(self.image_vertices)
+        imageVerts_vbo = self.imageVerts_vbo
 
         image_vertex_code = hf.load_shader("./shaders/image_shader.vert")
         island_gen_code = hf.load_shader("./shaders/islandGenerator.frag")
@@ -41,38 +57,17 @@ class ComputeWorker:
                 vertex_shader=image_vertex_code,
                 fragment_shader=island_gen_code
                 )
-
-        self.buffer_size = self.image_res[0] * self.image_res[1] * 4
-        self.stock_buffer = self.ctx.texture(self.image_res, 4)
-        self.initial_state = self.ctx.texture(self.image_res, 4)
-        self.initial_state.write(target_images[0])
-        self.stock_buffer.write(target_images[1])
         self.island_gen_prog['fullRender'] = 6
-        self.initial_state.use(6)
-        self.island_buffer = self.ctx.buffer(reserve=self.buffer_size)
-        self.island_fbo = self.ctx.simple_framebuffer(self.image_res, components=4)
 
         self.island_gen_vao = self.ctx.vertex_array(self.island_gen_prog, [
             (imageVerts_vbo, '2f', 'in_position')
             ])
 
-        self.generate_islands()
-
-        target_buffer = self.classify_islands(target_images[0])
-
-        self.island_buffer.release()
-
         ########################################################################
         # Setup cutting pixel counter compute shader                           #
         ########################################################################
         count_program = hf.load_shader("./shaders/count_colors.glsl")
         self.counter_compute: moderngl.ComputeShader = self.ctx.compute_shader(count_program)
-        self.image_buffer = self.ctx.texture(self.image_res, 4)
-        self.image_buffer.write(self.initial_state.read())
-        target_buffer.release()
-        self.depthBuffer = self.ctx.depth_texture(self.image_res)
-        self.image_buffer.bind_to_image(1)
-        self.image_buffer.use(5)
         self.counter_compute['imageSlice'] = 1
         dtype = np.dtype('u4')
         uint_counters = np.array([0, 0, 0, 0,], dtype=dtype)
@@ -80,49 +75,197 @@ class ComputeWorker:
         self.uint_buffer.bind_to_storage_buffer(1)
         ########################################################################
 
+        ########################################################################
+        # Setup batched cutting pixel counter compute shader                   #
+        ########################################################################
+        batch_count_program = hf.load_shader("./shaders/count_colors_batched.glsl")
+        self.batch_counter_compute: moderngl.ComputeShader = self.ctx.compute_shader(batch_count_program)
+        self.batch_counter_compute['imageSlice'] = 1
+        self.candidate_capacity = 0
+        self.reserve_candidates(360)
+        ########################################################################
+
         ########################################################################
         # Setup whole image color counting                                     #
         ########################################################################
         image_count_code = hf.load_shader("./shaders/count_image_total.glsl")
-        self.mask_tex = self.ctx.texture(self.image_res, 1)
-        self.mask_tex.use(7)
         self.image_counter_compute: moderngl.ComputeShader = self.ctx.compute_shader(image_count_code)
         self.image_counter_compute['imageSlice'] = 5
         self.image_counter_compute['mask'] = 7
+        self.image_count_buffer = self.ctx.buffer(reserve=5 * 4, dynamic=True)
+        ########################################################################
+
+        self.setup_tool_programs()
+
+        ########################################################################
+        # Setup in-place cutter compute shader                                 #
         ########################################################################
+        cut_program = hf.load_shader("./shaders/cut_capsule.glsl")
+        self.cutter_compute: moderngl.ComputeShader = self.ctx.compute_shader(cut_program)
+        self.cutter_compute['imageSlice'] = 1
+        ########################################################################
+
+        self.allocated_res = None
+        if target_images is not None:
+            self.load_slice(target_images)
 
+    def setup_tool_programs(self):
+        '''
+        Compiles the programs whose search reach depends on the tool
+        diameter and the pixel resolution.
+        '''
         ########################################################################
         # Setup Link Location Program                                          #
         ########################################################################
-        link_loc_finder = hf.load_shader("./shaders/find_link_locs.frag")
-        self.link_finder_prog : moderngl.Program = self.ctx.program(
-            vertex_shader=image_vertex_code,
-            fragment_shader=link_loc_finder
-        )
-        self.link_finder_prog['imageSlice'] = 5
-        self.link_finder_prog['mask'] = 7
-        self.link_finder_prog['circleRadius'] = (self.tool_diameter / 2) / self.pixel_res
-        self.link_finder_vao = self.ctx.vertex_array(self.link_finder_prog, 
-            [
-                (imageVerts_vbo, '2f', 'in_position')
-            ])
+        link_radius = (self.tool_diameter / 2) / self.pixel_res
+        #The search reaches the link radius plus the 1.5 pixels of PROX.
+        link_loc_finder = hf.load_shader("./shaders/find_link_locs.glsl",
+                                         self.tile_defines(math.ceil(link_radius + 1.5) + 1))
+        self.link_finder_compute: moderngl.ComputeShader = self.ctx.compute_shader(link_loc_finder)
+        self.link_finder_compute['imageSlice'] = 5
+        self.link_finder_compute['mask'] = 7
+        self.link_finder_compute['circleRadius'] = link_radius
         ########################################################################
 
         ########################################################################
-        # Setup painter/cutter shader program and vao                          #
+        # Setup profile detection compute shader                               #
+        ########################################################################
+        profile_radius = self.tool_diameter / 2
+        space_allowance = 1.0
+        #Test circles sit up to a radius away and reach a radius further.
+        profile_code = hf.load_shader("./shaders/profile_detection.glsl",
+                                      self.tile_defines(2 * math.ceil(profile_radius + space_allowance) + 1))
+        self.profile_compute: moderngl.ComputeShader = self.ctx.compute_shader(profile_code)
+        self.profile_compute['slice'] = 6
+        self.profile_compute['islandLabels'] = 4
+        self.profile_compute['cutterRadius'] = profile_radius
+        self.profile_compute['spaceAllowance'] = space_allowance
         ########################################################################
-        paint_frag_code = hf.load_shader("./shaders/painter.frag")
-        self.painter_prog = self.ctx.program(vertex_shader=image_vertex_code,
-                fragment_shader=paint_frag_code)
 
-        self.painter_prog['prev_render'] = 5
+    def set_tool(self, pixel_res, diameter):
+        '''
+        Points the worker at another tool or pixel resolution. Only the
+        programs depending on them are compiled again, and only when
+        either changed.
+        '''
+        if pixel_res == self.pixel_res and diameter == self.tool_diameter:
+            return
 
-        self.painter_vao = self.ctx.vertex_array(self.painter_prog, [
-            (imageVerts_vbo, '2f', 'in_position')
-            ])
+        super().set_tool(pixel_res, diameter)
+        with self.ctx:
+            self.link_finder_compute.release()
+            self.profile_compute.release()
+            self.setup_tool_programs()
 
-        self.cut_buffer = self.ctx.buffer(reserve=self.buffer_size)
-        ########################################################################
+    def tile_defines(self, apron):
+        '''
+        Returns the defines of a tiled neighbourhood search shader whose
+        searches reach apron pixels past their own. The tile and its apron
+        are only kept in shared memory when they fit in the amount every
+        implementation provides, otherwise the shader reads the textures.
+        '''
+        defines = {"TILE_SIZE": TILE_SIZE, "APRON": apron}
+        tile_width = TILE_SIZE + 2 * apron
+        #Texels are packed 4 to a uint, a byte each.
+        if tile_width * tile_width <= MIN_SHARED_MEMORY_SIZE:
+            defines["USE_SHARED_TILE"] = 1
+
+        return defines
+
+    def allocate_images(self, img_res):
+        '''
+        Creates the textures and buffers sized to the slice resolution,
+        releasing the previous ones. Nothing is done when the resolution
+        has not changed, so every slice of a job shares the same memory.
+        '''
+        img_res = tuple(img_res)
+        if img_res == self.allocated_res:
+            return
+
+        if self.allocated_res is not None:
+            self.release_images()
+
+        self.image_res = img_res
+        #Slices are single channel label images, see Pixel_Labels.
+        self.buffer_size = self.image_res[0] * self.image_res[1]
+        self.stock_buffer = self.ctx.texture(self.image_res, 1, dtype='u1')
+        self.initial_state = self.ctx.texture(self.image_res, 1, dtype='u1')
+        self.island_buffer = self.ctx.buffer(reserve=self.buffer_size)
+        self.island_fbo = self.ctx.framebuffer(
+            [self.ctx.texture(self.image_res, 1, dtype='u1')],
+            self.ctx.depth_renderbuffer(self.image_res))
+
+        self.image_buffer = self.ctx.texture(self.image_res, 1, dtype='u1')
+
+        #Island masks are only written inside of their bounding box.
+        self.mask_tex = self.ctx.texture(self.image_res, 1, data=bytes(self.buffer_size))
+        self.mask_viewport = None
+
+        #Link count followed by room for a link location at every pixel.
+        self.link_buffer = self.ctx.buffer(reserve=(self.buffer_size + 1) * 4)
+
+        self.island_label_tex = self.ctx.texture(self.image_res, 1, dtype='i4')
+        self.profile_image = self.ctx.texture(self.image_res, 1, dtype='u1')
+        self.allocated_res = img_res
+
+    def bind_units(self):
+        '''
+        Binds the slice textures and the counter buffer to the units the
+        programs read them from. A Job can render on the same context
+        with units of its own, so every call binds them again instead of
+        only binding them once after allocation.
+        '''
+        self.image_buffer.bind_to_image(1)
+        self.island_label_tex.use(4)
+        self.image_buffer.use(5)
+        self.initial_state.use(6)
+        self.mask_tex.use(7)
+        self.uint_buffer.bind_to_storage_buffer(1)
+
+    def load_slice(self, target_images: Tuple[bytes, bytes], img_res = None):
+        '''
+        Points the worker at a new additive slice, replacing the working
+        slice and its islands. Textures are only reallocated when img_res
+        differs from the resolution of the previous slice.
+        '''
+        with self.ctx:
+            if img_res is None:
+                img_res = self.image_res
+            self.allocate_images(img_res)
+            self.bind_units()
+
+            self.initial_state.write(target_images[0])
+            self.stock_buffer.write(target_images[1])
+
+            self.generate_islands()
+
+            self.classify_islands()
+
+            self.image_buffer.write(target_images[0])
+
+    def release_images(self):
+        self.stock_buffer.release()
+        self.initial_state.release()
+        self.island_buffer.release()
+        for attachment in self.island_fbo.color_attachments:
+            attachment.release()
+        self.island_fbo.depth_attachment.release()
+        self.island_fbo.release()
+        self.image_buffer.release()
+        self.mask_tex.release()
+        self.link_buffer.release()
+        self.island_label_tex.release()
+        self.profile_image.release()
+        self.allocated_res = None
+
+    def release(self):
+        '''
+        Releases every GPU object of the worker along with its context.
+        '''
+        if self.allocated_res is not None:
+            with self.ctx:
+                self.release_images()
+        self.ctx.release()
 
     def generate_islands(self):
         '''
@@ -134,159 +277,238 @@ class ComputeWorker:
         self.island_fbo.clear()
         self.island_fbo.use()
         self.island_gen_vao.render(moderngl.TRIANGLE_STRIP)
-        self.island_fbo.read_into(self.island_buffer, components=4)
+        self.island_fbo.read_into(self.island_buffer, components=1, dtype='u1')
 
         island_data = np.frombuffer(self.island_buffer.read(), dtype='u1')
-        island_data = np.reshape(island_data, (self.image_res[1], self.image_res[0], 4))
-        self.color_fill = Image.fromarray(island_data, mode="RGBA")
+        island_data = np.reshape(island_data, (self.image_res[1], self.image_res[0]))
 
-        self.island_list = []
+        self.find_islands(island_data == 1)
 
-        no_alpha = cv2.cvtColor(island_data, cv2.COLOR_RGBA2RGB)
-        img = no_alpha.copy()
+    def classify_islands(self):
+        '''
+        Marks the profile pixels of every island of the slice in
+        profile_image with a single dispatch, using the island_labels
+        image of generate_islands. Islands never touch each other, so one
+        pass over all of them gives the same result as one per island.
+        Nothing reads profile_image yet, load_slice discards the result
+        and initial_state is left as it was rendered. Returns
+        profile_image.
+        '''
+        self.island_label_tex.write(np.ascontiguousarray(self.island_labels, dtype=np.int32))
+        self.profile_image.bind_to_image(3, read=False, write=True)
+        self.profile_compute.run(self.image_res[0] // TILE_SIZE + 1,
+                                 self.image_res[1] // TILE_SIZE + 1)
+        self.ctx.memory_barrier()
 
-        for color in range(1, 255):
-            seeds = np.argwhere(img[:, :, 2] > 250) #type: ignore
-            if seeds.size > 0:
-                seed_coord = seeds[0]
-                seed_coord = np.array([seed_coord[1], seed_coord[0]])
-            else:
-                break
-
-            floodval = (0, color, 0)
-            lower_range = np.array([0, color, 0])
-            upper_range = np.array([0, color, 0])
-            cv2.floodFill(img, None, seedPoint=seed_coord, newVal=floodval)
-            mask = cv2.inRange(img, lower_range, upper_range)
-
-            mask_size = sys.getsizeof(mask)
-            self.island_list.append([color, mask_size, mask.copy()])
-
-    def classify_islands(self, imageSlice):
-        #Get Buffers/Render Target Ready
-        inputMaskBuffer = self.ctx.buffer(reserve=self.island_list[0][1])
-        sliceInputBuffer = self.ctx.buffer(reserve=self.buffer_size)
-        sliceInputBuffer.write(imageSlice)
-        slice = self.ctx.texture(self.image_res, 4)
-        slice.write(sliceInputBuffer)
-        current_mask = self.ctx.texture(self.image_res, 1)
-        sliceOut = self.ctx.texture(self.image_res, 4)
-        depthBuf = self.ctx.depth_texture(self.image_res)
-        fbo = self.ctx.framebuffer([sliceOut], depthBuf)
-        imageVBO = self.ctx.buffer(self.image_vertices)
-
-        #Get Programs/VAOs ready
-        imageVertexCode = hf.load_shader("./shaders/image_shader.vert")
-        profileDetectionCode = hf.load_shader("./shaders/profile_detection.frag")
-        profileSearchProgram = self.ctx.program(
-            vertex_shader=imageVertexCode,
-            fragment_shader=profileDetectionCode
-        )
-        profileSearchProgram['slice'] = 0
-        profileSearchProgram['islandMask'] = 1
-        #profileSearchProgram['outColor'] = 2
-        profileSearchProgram['cutterRadius'] = self.tool_diameter / 2
-        slice.use(location=0)
-        current_mask.use(location=1)
-        fbo.clear()
-        fbo.use()
-
-        profileDetectionVAO = self.ctx.vertex_array(
-            profileSearchProgram,
-            [ 
-                (imageVBO, '2f', 'in_position')
-            ])
-        
-        
-        for island in self.island_list:
-            inputMaskBuffer.write(island[2])
-            current_mask.write(inputMaskBuffer)
-            profileDetectionVAO.render(moderngl.TRIANGLE_STRIP)
-            fbo.read_into(sliceInputBuffer, components=4)
-            slice.write(sliceInputBuffer)
+        return self.profile_image
 
+    def check_cut(self, center1, center2, radius):
+        with self.ctx:
+            self.bind_units()
+            viewport = self.cut_viewport(center1, center2, radius)
+            if viewport is None:
+                return np.zeros(4, dtype=np.dtype('u4'))
+
+            self.counter_compute['circleCenters'] = center1[0], center1[1], center2[0], center2[1]
+            self.counter_compute['circleRadius'] = radius
+            self.counter_compute['originOffset'] = viewport[0], viewport[1]
+            quadUniform = self.counter_compute['quadPoints']
+            quadIUniform = self.counter_compute['quadIndices']
         
+            quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
+            sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
+            quadUniform.write(quad.flatten()) #type: ignore
+            quadIUniform.write(sorted_quad_indices) #type: ignore
+    
+            self.counter_compute.run(viewport[2] // 16 + 1, viewport[3] // 16 + 1)
 
-        #Release GPU Memory, Please
-        inputMaskBuffer.release()
-        slice.release()
-        current_mask.release()
-        sliceOut.release()
-        fbo.release()
-        imageVBO.release()
+            counters = np.frombuffer(self.uint_buffer.read(), dtype=np.dtype('u4'))
+            dtype = np.dtype('u4')
+            uint_counters = np.array([0, 0, 0, 0,], dtype=dtype)
+            self.uint_buffer.write(uint_counters)
 
-        return sliceInputBuffer
+            return counters
 
-    def check_cut(self, center1, center2, radius):
-        self.counter_compute['circleCenters'] = center1[0], center1[1], center2[0], center2[1]
-        self.counter_compute['circleRadius'] = radius
-        quadUniform = self.counter_compute['quadPoints']
-        quadIUniform = self.counter_compute['quadIndices']
-        
-        quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
-        sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
-        quadUniform.write(quad.flatten()) #type: ignore
-        quadIUniform.write(sorted_quad_indices) #type: ignore
-    
-        self.counter_compute.run(self.image_res[0] // 16 + 1, self.image_res[1] // 16 + 1)
+    def reserve_candidates(self, count):
+        '''
+        Makes sure the candidate and counter SSBOs used by check_cuts can
+        hold at least the given amount of candidate cuts.
+        '''
+        if count <= self.candidate_capacity:
+            return
 
-        counters = np.frombuffer(self.uint_buffer.read(), dtype=np.dtype('u4'))
-        dtype = np.dtype('u4')
-        uint_counters = np.array([0, 0, 0, 0,], dtype=dtype)
-        self.uint_buffer.write(uint_counters)
+        if self.candidate_capacity > 0:
+            self.candidate_buffer.release()
+            self.batch_counter_buffer.release()
 
-        return counters
+        self.candidate_capacity = max(count, self.candidate_capacity * 2)
+        self.candidate_buffer = self.ctx.buffer(
+            reserve=self.candidate_capacity * CANDIDATE_DTYPE.itemsize, dynamic=True)
+        self.batch_counter_buffer = self.ctx.buffer(
+            reserve=self.candidate_capacity * 4 * 4, dynamic=True)
 
+    def check_cuts(self, center1, centers2, radius):
+        '''
+        Batched version of check_cut. Counts the pixels of every cut going
+        from center1 to each of the (N, 2) destinations in centers2 with a
+        single dispatch and a single readback. Returns an (N, 4) array of
+        counters, one row per destination, in the same order as check_cut.
+        '''
+        with self.ctx:
+            self.bind_units()
+            center1 = np.asarray(center1, dtype='f8')
+            centers2 = np.asarray(centers2, dtype='f8').reshape(-1, 2)
+            candidate_count = centers2.shape[0]
+            if candidate_count == 0:
+                return np.zeros((0, 4), dtype=np.dtype('u4'))
+
+            #Every candidate is dispatched over the box holding all of them.
+            viewport = self.cuts_viewport(center1, centers2, radius)
+            if viewport is None:
+                return np.zeros((candidate_count, 4), dtype=np.dtype('u4'))
+
+            quads, quad_indices = na.find_capsule_quads(center1, centers2, radius) #type: ignore
+            candidates = np.zeros(candidate_count, dtype=CANDIDATE_DTYPE)
+            candidates['circleCenters'][:, 0:2] = center1
+            candidates['circleCenters'][:, 2:4] = centers2
+            candidates['quadPoints'] = quads
+            candidates['quadIndices'] = quad_indices
+
+            self.reserve_candidates(candidate_count)
+            counters_size = candidate_count * 4 * 4
+            self.candidate_buffer.write(candidates.tobytes())
+            self.batch_counter_buffer.clear(size=counters_size)
+            self.candidate_buffer.bind_to_storage_buffer(3)
+            self.batch_counter_buffer.bind_to_storage_buffer(4)
+            self.batch_counter_compute['circleRadius'] = radius
+            self.batch_counter_compute['originOffset'] = viewport[0], viewport[1]
+
+            self.batch_counter_compute.run(viewport[2] // 16 + 1,
+                                           viewport[3] // 16 + 1,
+                                           candidate_count)
+
+            counters = np.frombuffer(self.batch_counter_buffer.read(size=counters_size),
+                                     dtype=np.dtype('u4'))
+            return counters.reshape(candidate_count, 4)
 
     def make_cut(self, center1, center2, radius):
-        self.painter_prog['circleCenters'] = center1[0], center1[1], center2[0], center2[1]
-        self.painter_prog['circleRadius'] = radius
-
-        quadUniform = self.painter_prog['quadPoints']
-        quadIUniform = self.painter_prog['quadIndices']
+        '''
+        Removes the material inside of a cut directly in the working
+        slice on the GPU. Only the region the cut can touch is dispatched.
+        '''
+        with self.ctx:
+            self.bind_units()
+            viewport = self.cut_viewport(center1, center2, radius)
+            if viewport is None:
+                return
+
+            self.cutter_compute['circleCenters'] = center1[0], center1[1], center2[0], center2[1]
+            self.cutter_compute['circleRadius'] = radius
+            self.cutter_compute['originOffset'] = viewport[0], viewport[1]
+
+            quadUniform = self.cutter_compute['quadPoints']
+            quadIUniform = self.cutter_compute['quadIndices']
         
-        quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
-        sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
-        quadUniform.write(quad.flatten()) #type: ignore
-        quadIUniform.write(sorted_quad_indices) #type: ignore
+            quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
+            sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
+            quadUniform.write(quad.flatten()) #type: ignore
+            quadIUniform.write(sorted_quad_indices) #type: ignore
 
-        self.island_fbo.use()
-        self.island_fbo.clear()
-        self.painter_vao.render(moderngl.TRIANGLE_STRIP)
+            self.cutter_compute.run(viewport[2] // 16 + 1, viewport[3] // 16 + 1)
+            #Following counts, link searches and reads must see the new slice.
+            self.ctx.memory_barrier()
 
-        self.island_fbo.read_into(self.cut_buffer, components=4, dtype='f1')
-        self.image_buffer.write(self.cut_buffer)
+    def upload_island_mask(self, island):
+        '''
+        Writes an island's cropped mask into mask_tex at its bounding box,
+        after clearing the box of the previously written mask. Only the
+        two boxes are transferred, never the whole image.
+        '''
+        (number, mask_size, mask, bbox) = island
+        if self.mask_viewport == bbox:
+            self.mask_tex.write(mask, viewport=bbox)
+            return
+
+        if self.mask_viewport is not None:
+            (x, y, w, h) = self.mask_viewport
+            self.mask_tex.write(bytes(w * h), viewport=self.mask_viewport)
+
+        self.mask_tex.write(mask, viewport=bbox)
+        self.mask_viewport = bbox
+
+    def count_pixels(self, island=None):
+        with self.ctx:
+            self.bind_units()
+            if island is not None:
+                self.upload_island_mask(island)
+                self.image_counter_compute['useMask'] = True;
+            else:
+                self.image_counter_compute['useMask'] = False;
 
-    def count_pixels(self, counter_buffer, mask_buffer = False):
-        if mask_buffer:
-            self.image_counter_compute['useMask'] = True;
-        else:
-            self.image_counter_compute['useMask'] = False;
+            self.image_count_buffer.clear()
+            self.image_count_buffer.bind_to_storage_buffer(2)
+            self.image_counter_compute.run(self.image_res[0] // 16 + 1, self.image_res[1] // 16 + 1)
 
-        counter_buffer.bind_to_storage_buffer(2)
-        self.image_counter_compute.run(self.image_res[0] // 16 + 1, self.image_res[1] // 16 + 1)
+            return np.frombuffer(self.image_count_buffer.read(), dtype=np.dtype('u4'))
 
-    def find_link_locations(self, mask : moderngl.Buffer):
-        self.mask_tex.write(mask)
-        self.island_fbo.use()
-        self.island_fbo.clear()
-        self.link_finder_vao.render(moderngl.TRIANGLE_STRIP)
+    def find_link_locations(self, island):
+        with self.ctx:
+            self.bind_units()
+            self.upload_island_mask(island)
+            link_image = self.run_link_finder()
+            link_locations = np.frombuffer(link_image.read(), dtype='u1')
+            link_locations = np.reshape(link_locations, (self.image_res[1], self.image_res[0]))
+            return link_locations
+
+    def run_link_finder(self):
+        '''
+        Runs the link finder over the island in mask_tex. The link image is
+        written to the island framebuffer's texture, which is returned, and
+        the link locations are appended to link_buffer.
+        '''
+        link_image = self.island_fbo.color_attachments[0]
+        link_image.bind_to_image(2, read=False, write=True)
+        self.link_buffer.clear(size=4)
+        self.link_buffer.bind_to_storage_buffer(5)
+        self.link_finder_compute.run(self.image_res[0] // TILE_SIZE + 1,
+                                     self.image_res[1] // TILE_SIZE + 1)
+        self.ctx.memory_barrier()
+        return link_image
+
+    def find_link_coords(self, island):
+        '''
+        Same as EngagementWorker.find_link_coords, but only the count and
+        the compacted list of link locations are read back, never the link
+        image itself.
+        '''
+        with self.ctx:
+            self.bind_units()
+            self.upload_island_mask(island)
+            self.run_link_finder()
+
+            link_count = int(np.frombuffer(self.link_buffer.read(size=4), dtype='u4')[0])
+            if link_count == 0:
+                return np.zeros((0, 2), dtype=np.int64)
 
-        link_locations = np.frombuffer(self.island_fbo.read(components=4, dtype='f1'), dtype='u1')
-        link_locations = np.reshape(link_locations, (self.image_res[1], self.image_res[0], 4))
-        return link_locations
+            #Each location is a little endian (row, column) pair of uint16s.
+            coords = np.frombuffer(self.link_buffer.read(size=link_count * 4, offset=4), dtype='<u2')
+            coords = coords.reshape(link_count, 2).astype(np.int64)
+            #Appends land in any order, sort them like np.argwhere does.
+            return coords[np.lexsort((coords[:, 1], coords[:, 0]))]
 
     def retrieve_image(self):
-        image = np.frombuffer(self.image_buffer.read(), dtype='u1')
-        image = np.reshape(image, (self.image_res[1], self.image_res[0], 4))
-        image = np.flip(image, 0)
-        return image
+        with self.ctx:
+            labels = np.frombuffer(self.image_buffer.read(), dtype='u1')
+            labels = np.reshape(labels, (self.image_res[1], self.image_res[0]))
+            image = np.flip(pl.labels_to_rgba(labels), 0)
+            return image
 
     def retrieve_islands(self):
-        image = np.frombuffer(self.island_fbo.read(components=4, dtype='f1'), dtype='u1')
-        image = np.reshape(image, (self.image_res[1], self.image_res[0], 4))
-        image = np.flip(image, 0)
-        return image
+        with self.ctx:
+            labels = np.frombuffer(self.island_fbo.read(components=1, dtype='u1'), dtype='u1')
+            labels = np.reshape(labels, (self.image_res[1], self.image_res[0]))
+            image = np.flip(pl.labels_to_rgba(labels), 0)
+            return image
 
     def find_rectangle_points(self, center1, center2, radius):
         '''
@@ -0,0 +1,100 @@
+from typing import Tuple
+import numpy as np
+
+import NumbaAccelerated as na
+import Pixel_Labels as pl
+from engagementWorker import EngagementWorker
+
+class CPUWorker(EngagementWorker):
+    '''
+    An engagement engine that runs entirely on the CPU, for machines
+    without a usable GPU. The additive slice is kept as a label array
+    (see Pixel_Labels) and every operation is a Numba kernel that only
+    visits the bounding box of the cut it works on.
+
+    Takes the same parameters as ComputeWorker.
+    '''
+    def __init__(self,
+            pixel_res: float,
+            target_images: Tuple[bytes, bytes],
+            img_res,
+            diameter,
+            treat_green_as_red = False,
+            ):
+        super().__init__(pixel_res, img_res, diameter)
+        self.treat_green_as_red = treat_green_as_red
+
+        if target_images is not None:
+            self.load_slice(target_images)
+
+    def load_slice(self, target_images: Tuple[bytes, bytes], img_res = None):
+        if img_res is not None:
+            self.image_res = img_res
+
+        labels = np.frombuffer(target_images[0], dtype='u1')
+        self.labels = np.reshape(labels, (self.image_res[1], self.image_res[0])).copy()
+
+        self.generate_islands()
+
+    def generate_islands(self):
+        '''
+        Finds the stock islands of the slice, same as the islandGenerator
+        shader does for ComputeWorker.
+        '''
+        not_island = np.isin(self.labels, (pl.MODEL, pl.OBSTACLE, pl.PROFILE))
+        self.find_islands(~not_island)
+
+    def check_cut(self, center1, center2, radius):
+        return self.check_cuts(center1, [center2], radius)[0]
+
+    def check_cuts(self, center1, centers2, radius):
+        center1 = np.asarray(center1, dtype='f8')
+        centers2 = np.asarray(centers2, dtype='f8').reshape(-1, 2)
+        candidate_count = centers2.shape[0]
+
+        viewports = np.zeros((candidate_count, 4), dtype=np.int64)
+        for i in range(candidate_count):
+            viewport = self.cut_viewport(center1, centers2[i], radius)
+            if viewport is not None:
+                viewports[i] = viewport
+
+        quads, quad_indices = na.find_capsule_quads(center1, centers2, radius) #type: ignore
+        return na.count_cuts(self.labels, viewports, center1, centers2, radius,
+                             quads, quad_indices, self.treat_green_as_red)
+
+    def make_cut(self, center1, center2, radius):
+        center1 = np.asarray(center1, dtype='f8')
+        center2 = np.asarray(center2, dtype='f8')
+        viewport = self.cut_viewport(center1, center2, radius)
+        if viewport is None:
+            return
+
+        quad: np.ndarray = na.find_rectangle_points(center1, center2, radius) #type: ignore
+        sorted_quad_indices = na.sort_rectangle_verts(quad) #type: ignore
+        na.cut_capsule(self.labels, np.array(viewport), center1, center2, radius,
+                       quad, sorted_quad_indices)
+
+    def count_pixels(self, island=None):
+        labels = self.labels
+        if island is not None:
+            (number, mask_size, mask, (x, y, w, h)) = island
+            labels = labels[y:y + h, x:x + w][mask >= 230]
+
+        class_counts = np.bincount(labels.ravel(), minlength=len(pl.PALETTE))
+        model = class_counts[pl.MODEL]
+        margin = class_counts[pl.MARGIN]
+        obstacle = class_counts[pl.OBSTACLE]
+        solid = np.sum(class_counts) - class_counts[pl.EMPTY]
+
+        return np.array([model, margin, obstacle, solid - model - margin - obstacle,
+                         labels.size], dtype=np.dtype('u4'))
+
+    def find_link_locations(self, island):
+        (number, mask_size, mask, (x, y, w, h)) = island
+        radius = (self.tool_diameter / 2) / self.pixel_res
+        return na.find_link_pixels(self.labels, mask, np.array([y, x]), radius, True)
+
+    def retrieve_image(self):
+        image = pl.labels_to_rgba(self.labels)
+        image = np.flip(image, 0)
+        return image
@@ -0,0 +1,179 @@
+import numpy as np
+import cv2
+import sys
+
+import Helper_Functions as hf
+import Pixel_Labels as pl
+
+class EngagementWorker:
+    '''
+    The interface shared by every engagement engine. An engine holds a
+    single additive slice and answers the questions the path planner asks
+    about it: which material a cut would remove, removing the material of
+    an accepted cut, counting the pixels of the slice and finding the
+    locations the tool can link to.
+
+    Centers given to the cut functions use the flipped (row, column)
+    order the planner has always handed to ComputeWorker.
+    '''
+    def __init__(self, pixel_res: float, img_res, diameter):
+        self.pixel_res = pixel_res
+        self.image_res = img_res
+        self.tool_diameter = diameter
+        self.island_list = []
+        self.island_labels = None
+        self.island_bboxes = np.zeros((0, 4), dtype=np.int32)
+        self.island_areas = np.zeros(0, dtype=np.int32)
+        self.island_centroids = np.zeros((0, 2), dtype=np.float64)
+
+    def load_slice(self, target_images, img_res = None):
+        '''
+        Replaces the working slice with a new additive slice, given as
+        the tuple of its result and stock only images.
+        '''
+        raise NotImplementedError
+
+    def set_tool(self, pixel_res, diameter):
+        '''
+        Points the engine at another tool or pixel resolution, so a single
+        engine can serve slices of different jobs.
+        '''
+        self.pixel_res = pixel_res
+        self.tool_diameter = diameter
+
+    def release(self):
+        '''
+        Frees the resources held by the engine.
+        '''
+        pass
+
+    def check_cut(self, center1, center2, radius):
+        '''
+        Counts the model, obstacle, stock and empty pixels a cut from
+        center1 to center2 would touch, leaving out the circle the tool
+        is already sitting in. Returns an array of those 4 counters.
+        '''
+        raise NotImplementedError
+
+    def check_cuts(self, center1, centers2, radius):
+        '''
+        Batched version of check_cut for an (N, 2) array of destinations.
+        Returns an (N, 4) array of counters.
+        '''
+        raise NotImplementedError
+
+    def make_cut(self, center1, center2, radius):
+        '''
+        Removes the material inside of a cut from the working slice.
+        '''
+        raise NotImplementedError
+
+    def count_pixels(self, island=None):
+        '''
+        Counts the model, margin, obstacle, other solid and total pixels of
+        the slice. When an island (an entry of island_list) is given only
+        pixels inside of its mask count.
+        '''
+        raise NotImplementedError
+
+    def find_link_locations(self, island):
+        '''
+        Returns a label image marking with LINK the empty locations the
+        tool could be moved to, next to the stock of the given island, an
+        entry of island_list.
+        '''
+        raise NotImplementedError
+
+    def find_link_coords(self, island):
+        '''
+        Returns the (row, column) coordinates of every link location of
+        find_link_locations as an (N, 2) array, sorted by row then column.
+        '''
+        return np.argwhere(self.find_link_locations(island) == pl.LINK)
+
+    def retrieve_image(self):
+        '''
+        Returns the current state of the working slice as an RGBA image,
+        flipped to be viewed or saved.
+        '''
+        raise NotImplementedError
+
+    def find_islands(self, island_mask):
+        '''
+        Takes a mask of every pixel that belongs to a stock island and
+        labels its 4-connected islands in a single pass. island_labels
+        becomes an int32 image holding the number of every pixel's island,
+        0 outside of them, and island_bboxes, island_areas and
+        island_centroids hold the (x, y, width, height) box, pixel count
+        and (x, y) centroid of each island.
+
+        island_list gets one entry per island, containing the number
+        representing the island, the size of its mask, the mask itself
+        cropped to the island's bounding box, and that (x, y, width,
+        height) bounding box.
+        '''
+        img = np.where(island_mask, 255, 0).astype('u1')
+        (count, labels, stats, centroids) = cv2.connectedComponentsWithStats(
+            img, connectivity=4, ltype=cv2.CV_32S)
+
+        #Component 0 is everything that is not an island.
+        self.island_labels = labels
+        self.island_bboxes = stats[1:, 0:4]
+        self.island_areas = stats[1:, cv2.CC_STAT_AREA]
+        self.island_centroids = centroids[1:]
+
+        self.island_list = []
+        for number in range(1, count):
+            (x, y, w, h) = (int(value) for value in stats[number, 0:4])
+            mask = np.where(labels[y:y + h, x:x + w] == number, 255, 0).astype('u1')
+
+            mask_size = sys.getsizeof(mask)
+            self.island_list.append([number, mask_size, mask, (x, y, w, h)])
+
+    def clip_bbox(self, bbox):
+        '''
+        Clips a (top, bottom, left, right) bounding box, as returned by
+        Helper_Functions.double_circle_bbox, to the image. Returns the
+        region as an (x, y, width, height) viewport, or None if the box
+        lies completely outside of the image.
+        '''
+        (top, bottom, left, right) = bbox
+        top = min(top, self.image_res[1] - 1)
+        bottom = max(bottom, 0)
+        left = max(left, 0)
+        right = min(right, self.image_res[0] - 1)
+
+        if right < left or top < bottom:
+            return None
+
+        return (left, bottom, right - left + 1, top - bottom + 1)
+
+    def cut_viewport(self, center1, center2, radius):
+        '''
+        Returns the viewport of the image that a cut between the two
+        centers can touch. Centers use the flipped coordinate order of
+        check_cut and make_cut.
+        '''
+        bbox = hf.double_circle_bbox(np.flip(center1), radius, np.flip(center2), radius)
+        return self.clip_bbox(bbox)
+
+    def cuts_viewport(self, center1, centers2, radius):
+        '''
+        Returns the viewport of the image that any of the cuts going from
+        center1 to the (N, 2) destinations in centers2 can touch.
+        '''
+        all_centers = np.vstack((center1, centers2))
+        return self.clip_bbox(hf.multi_circle_bbox(np.flip(all_centers, axis=1), radius))
+
+    def check_cut_fan(self, center1, directions, distance, radius):
+        '''
+        Checks a fan of cuts of the same length starting at center1, one
+        for each direction (in degrees) given. center1 uses the same
+        flipped coordinate order as check_cut. Returns the destinations
+        of each cut along with their counters from check_cuts.
+        '''
+        thetas = np.radians(np.asarray(directions, dtype='f8'))
+        offsets = np.column_stack((np.sin(thetas), np.cos(thetas))) * distance
+        destinations = offsets + np.asarray(center1, dtype='f8')
+
+        return destinations, self.check_cuts(center1, destinations, radius)
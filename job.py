@@ -3,20 +3,736 @@
 import sys
 import math
 import numpy as np
+import numba
 import moderngl
 import glm
 import os
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
 import Helper_Functions as hf
+import Pixel_Labels as pl
+from Link_Index import LinkIndex
+from Toolpath import Toolpath, CUT, LINK, RETRACT
+from Trace_Capture import TraceCapture
 import NumbaAccelerated as na
 from Discretized_Model import DiscretizedModel
 from computeWorker import ComputeWorker
+from cpuWorker import CPUWorker
+from bitplaneWorker import BitplaneWorker
 
 sys.path.insert(0, sys.path[0] + '/renderdoc_ctypes')
 from renderdoc_api import RenderDocAPI
 
-class Job:
+#Engagement engines a job can plan its paths with.
+WORKER_BACKENDS = {
+    "opengl": ComputeWorker,
+    "cpu": CPUWorker,
+    "bitplane": BitplaneWorker,
+}
+
+#Ways find_cut can search a fan of cut directions, see Job.find_cut.
+SEARCH_STRATEGIES = ("exhaustive", "bisection")
+
+#Every how many fan directions the bisection strategy samples at first.
+COARSE_STEP = 8
+
+#Sizes of the first and largest batches the exhaustive strategy checks,
+#batches double in between.
+FIRST_CHUNK_SIZE = 16
+MAX_CHUNK_SIZE = 128
+
+def engagement_ratios(cut_stats):
+    '''
+    Returns the ratio of stock to empty pixels of every cut in an (N, 4)
+    array of cut counters, 1.0 when a cut has no empty pixels, along with
+    whether each cut stays clear of model and obstacle pixels.
+    '''
+    cut_stats = np.asarray(cut_stats, dtype='f8').reshape(-1, 4)
+    allowed = (cut_stats[:, 0] < 1) & (cut_stats[:, 1] < 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(cut_stats[:, 3] < 1, 1.0, cut_stats[:, 2] / cut_stats[:, 3])
+
+    return ratios, allowed
+
+#Rough amount of memory a job needs for every pixel of its slices, on the
+#GPU for the render targets and the compute engine, and on the host for
+#the engine and intermediate images. The host also keeps every layer.
+GPU_BYTES_PER_PIXEL = 48
+HOST_BYTES_PER_PIXEL = 16
+HOST_BYTES_PER_LAYER_PIXEL = 2
+
+def calculate_bounds(stock_model, tool_diam):
+    '''
+    Calculates the bounding box of a job's stock model, with a margin
+    around it for the tool. Returns a tuple of (-x, x, -y, y, -z, z).
+    '''
+    rough_bounds = hf.get_model_min_max(stock_model)
+    lower_bounds_with_margin = np.floor(rough_bounds[0::2]) - math.ceil(tool_diam + 5)
+    higher_bounds_with_margin = np.ceil(rough_bounds[1::2]) + math.ceil(tool_diam + 5)
+    return (lower_bounds_with_margin[0], higher_bounds_with_margin[0],
+            lower_bounds_with_margin[1], higher_bounds_with_margin[1],
+            rough_bounds[4], rough_bounds[5])
+
+def calculate_resolution(bounds, target_res, max_res = None):
+    '''
+    Determines resolution of the images to be rendered. Without an OpenGL
+    context max_res can be left out to skip checking it against the
+    largest texture the GPU supports.
+    '''
+    res = (math.ceil((bounds[1] - bounds[0]) / target_res),
+           math.ceil((bounds[3] - bounds[2]) / target_res))
+    if max_res is not None and (res[0] > max_res or res[1] > max_res): #type: ignore
+        raise Exception("Resolution is too high for GPU", res)
+
+    return res
+
+def estimate_job_memory(stock_model, tool_diam, target_res, depth_of_cut,
+                        processes = 1, island_processes = 1):
+    '''
+    Estimates the memory a job will need before creating it, which needs
+    no OpenGL context. Returns a tuple of the GPU and host bytes.
+
+    Layer and island processes each create an engine of their own, so
+    the estimate grows with the processes the job fans out to. Layer
+    processes plan their islands serially, only one of the two fans out.
+    '''
+    bounds = calculate_bounds(stock_model, tool_diam)
+    res = calculate_resolution(bounds, target_res)
+    pixels = res[0] * res[1]
+    layer_count = math.ceil(np.abs(bounds[5] - bounds[4]) / depth_of_cut) + 1
+    if processes > 1:
+        children = processes
+    elif island_processes > 1:
+        children = island_processes
+    else:
+        children = 0
+
+    return (pixels * GPU_BYTES_PER_PIXEL * (1 + children),
+            pixels * (HOST_BYTES_PER_PIXEL * (1 + children) +
+                      HOST_BYTES_PER_LAYER_PIXEL * layer_count))
+
+class LayerPlanner:
+    '''
+    Plans the tool paths of additive slices, one slice at a time. Only
+    holds what planning needs, the tool, the pixel resolution, the
+    offset, the engagement engine and the search strategy, so a planner
+    can be recreated from planner_args in other processes. Job adds the
+    models and everything needed to render the slices.
+
+    worker is an engagement engine of the backend to plan with instead
+    of creating one, it is left alive on release so it can serve more
+    planners.
+    '''
+    def __init__(self, tool_diam: float, target_res: float, img_res,
+                 offset_coord = [0, 0, 0], backend = "opengl",
+                 search_strategy = "exhaustive", island_processes = 1,
+                 trace = None, worker = None):
+        if backend not in WORKER_BACKENDS:
+            raise Exception(f"Unknown worker backend {backend}, expected one of {list(WORKER_BACKENDS)}")
+        if search_strategy not in SEARCH_STRATEGIES:
+            raise Exception(f"Unknown search strategy {search_strategy}, expected one of {list(SEARCH_STRATEGIES)}")
+
+        self.tool_diam = tool_diam
+        self.target_res = target_res
+        self.img_res = img_res
+        self.offset = np.array(offset_coord)
+        self.backend = backend
+        self.search_strategy = search_strategy
+        self.island_processes = island_processes
+        self.island_pool = None
+        #Debug trace of the slice while planning, off unless one is given.
+        self.trace = trace if trace is not None else TraceCapture()
+        #Running step counts of the traces, so frames of later cutting
+        #moves and layers never reuse the names of earlier ones.
+        self.link_count = 0
+        self.cut_count = 0
+        self.worker_class = WORKER_BACKENDS[backend]
+        if worker is not None and not isinstance(worker, self.worker_class):
+            raise Exception(f"A {type(worker).__name__} can not plan with the {backend} backend")
+        self.worker = worker
+        self.owns_worker = worker is None
+
+    def planner_args(self):
+        '''
+        Returns the arguments a LayerPlanner planning like this one is
+        created with, without the trace.
+        '''
+        return (self.tool_diam, self.target_res, tuple(self.img_res),
+                self.offset.tolist(), self.backend, self.search_strategy,
+                self.island_processes)
+
+    def release(self):
+        if self.worker is not None and self.owns_worker:
+            self.worker.release()
+        self.worker = None
+        if self.island_pool is not None:
+            self.island_pool.shutdown()
+            self.island_pool = None
+
+    def checkCuts(self, cw : ComputeWorker,
+                 coords : np.ndarray,
+                 direction : float,
+                 tool_rad: float,
+                 deg_inc: float,
+                 iterations: int,
+                 distance: float,
+                 clockwiseScan = True):
+        '''
+        Runs the batched cut counter compute shader from the given compute
+        worker once, incrememting the the angle of attack for each candidate
+        in order to return multiple possible cut results. It can
+        scan in a clockwise direction (the default) or counter clockwise.
+        Must be provided with the current endmill center coordinates
+        and the current direction the end mill is going.
+
+        Degree increment determines how far each iterations is rotated
+        in the determined direction (clockwise or ccw).
+        '''
+
+        if direction >= 360.0 or direction < 0.0:
+            raise Exception(f"direction should be between 0 (inclusive) to 360 (exclusive), not {direction}")
+
+        #All directions are evaluated by the worker in a single batch.
+        tested_directions = self.fan_directions(direction, deg_inc, iterations, clockwiseScan)
+        destinations, cut_stats = cw.check_cut_fan(np.flip(coords), tested_directions,
+                                                   distance, tool_rad)
+        test_vectors = np.flip(destinations, axis=1)
+
+        return [test_vectors, cut_stats, tested_directions]
+
+    def iter_cut_chunks(self, cw, coords, direction, tool_rad, deg_inc,
+                        iterations, distance, clockwiseScan = True):
+        '''
+        Lazy version of checkCuts. The fan is checked in batches, in scan
+        order, each one yielded as the same list checkCuts returns. The
+        first batch holds FIRST_CHUNK_SIZE cuts and every next one twice
+        as many, up to MAX_CHUNK_SIZE, so a caller that stops early only
+        pays for the cuts it looked at.
+        '''
+        tested_directions = self.fan_directions(direction, deg_inc, iterations, clockwiseScan)
+        start = 0
+        chunk_size = FIRST_CHUNK_SIZE
+        while start < iterations:
+            chunk_directions = tested_directions[start:start + chunk_size]
+            destinations, cut_stats = cw.check_cut_fan(np.flip(coords), chunk_directions,
+                                                       distance, tool_rad)
+            yield [np.flip(destinations, axis=1), cut_stats, chunk_directions]
+
+            start += chunk_size
+            chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+
+    def fan_directions(self, direction, deg_inc, iterations, clockwiseScan = True):
+        '''
+        Returns the directions, in degrees, of a fan of iterations cuts
+        starting at direction and rotating by deg_inc each time.
+        '''
+        scan_direction = 1
+        if clockwiseScan == True:
+            scan_direction = -1
+
+        tested_directions = direction + np.arange(iterations) * (deg_inc * scan_direction)
+        return np.mod(tested_directions, 360.0)
+
+    def find_cut(self, cw, coords, direction, tool_rad, deg_inc, iterations,
+                 distance, lower_bound, upper_bound, clockwiseScan = True,
+                 strategy = None):
+        '''
+        Searches the same fan of cuts as checkCuts for a cut clear of model
+        and obstacles whose engagement ratio lies strictly between the
+        lower and upper bounds. Returns the (x, y) destination, direction
+        and ratio of the cut found, or None.
+
+        The "exhaustive" strategy checks the directions in scan order, in
+        growing batches, and stops at the first cut that fits. The "bisection" strategy only
+        checks every COARSE_STEP-th direction, then bisects the intervals
+        where the ratio moves towards the band to find a fitting cut near
+        where it enters it. strategy defaults to the job's strategy.
+        '''
+        if direction >= 360.0 or direction < 0.0:
+            raise Exception(f"direction should be between 0 (inclusive) to 360 (exclusive), not {direction}")
+        if strategy is None:
+            strategy = self.search_strategy
+        directions = self.fan_directions(direction, deg_inc, iterations, clockwiseScan)
+
+        def band_states(cut_stats):
+            (ratios, allowed) = engagement_ratios(cut_stats)
+            #-1 below the band, 0 inside of it, 1 above it or not allowed.
+            states = np.where(~allowed | (ratios >= upper_bound), 1,
+                              np.where(ratios <= lower_bound, -1, 0))
+            return ratios, states
+
+        def evaluate(indices):
+            destinations, cut_stats = cw.check_cut_fan(np.flip(coords), directions[indices],
+                                                       distance, tool_rad)
+            (ratios, states) = band_states(cut_stats)
+            return np.flip(destinations, axis=1), ratios, states
+
+        if strategy == "exhaustive":
+            for (destinations, cut_stats, chunk_directions) in self.iter_cut_chunks(
+                    cw, coords, direction, tool_rad, deg_inc, iterations,
+                    distance, clockwiseScan):
+                (ratios, states) = band_states(cut_stats)
+                for i in np.flatnonzero(states == 0)[:1]:
+                    return destinations[i], chunk_directions[i], ratios[i]
+            return None
+
+        if strategy != "bisection":
+            raise Exception(f"Unknown search strategy {strategy}, expected one of {list(SEARCH_STRATEGIES)}")
+
+        coarse = np.unique(np.append(np.arange(0, iterations, COARSE_STEP), iterations - 1))
+        (destinations, ratios, states) = evaluate(coarse)
+        if states[0] == 0:
+            return destinations[0], directions[0], ratios[0]
+
+        for j in range(1, len(coarse)):
+            if states[j] == states[j - 1]:
+                continue
+
+            #Bisect for the first direction leaving the state of the
+            #interval's start, the band has to be entered there.
+            (low, high) = (coarse[j - 1], coarse[j])
+            (found, found_ratio) = (destinations[j], ratios[j])
+            found_state = states[j]
+            while high - low > 1:
+                middle = (low + high) // 2
+                (middle_dest, middle_ratio, middle_state) = evaluate(np.array([middle]))
+                if middle_state[0] == states[j - 1]:
+                    low = middle
+                else:
+                    (high, found, found_ratio) = (middle, middle_dest[0], middle_ratio[0])
+                    found_state = middle_state[0]
+
+            if found_state == 0:
+                return found, directions[high], found_ratio
+
+            #Bisecting can run into a different transition than the one
+            #the band was sampled in, the coarse sample still fits then.
+            if states[j] == 0:
+                return destinations[j], directions[coarse[j]], ratios[j]
+
+        return None
+
+    def check_image(self, worker):
+        return worker.count_pixels()
+
+    def check_image_masked(self, worker, island):
+        return worker.count_pixels(island)
+
+    def cutting_move(self, worker, toolpath, startLoc,
+                     start_dir = 0.0, dist_inc = 2.0,
+                     material_removal_ratio = 0.2, height = 0.0):
+        distance = dist_inc
+        distance_adjusted = distance / self.target_res
+
+        tool_radius = self.tool_diam / 2 / self.target_res
+        current_direction = start_dir
+        materialRemovalRatio = material_removal_ratio
+        currentLoc = startLoc
+        toolpath.start_chain(CUT)
+        toolpath.append(currentLoc * self.target_res, height)
+        emptyCounter = 0
+        easing_factor = 6
+        lower_bound_per = 0.85
+        for i in range(20000):
+            if currentLoc[0] < 0 or currentLoc[0] > self.img_res[0]:
+                print("Outside X Image Bounds")
+                break
+            if currentLoc[1] < 0 or currentLoc[1] > self.img_res[1]:
+                print("Outside Y Image Bounds")
+                break
+
+            self.trace.capture("testCut", self.cut_count, worker.retrieve_image)
+            self.cut_count += 1
+            x_y_offset = self.offset[0:2]
+
+            #if i % 1000 == 0:
+            #print(f"Iteration: {i}")
+
+            lower_bound = (material_removal_ratio * lower_bound_per)
+            low_bound_mod = (i + 0.1) / easing_factor
+            lower_bound = lower_bound * na.clamp(low_bound_mod, 0.05, 1.0)
+
+            #Scan one way first, then the other way if nothing fits.
+            cut = None
+            for (deg_inc, iterations) in ((0.5, 280), (-0.5, 250)):
+                cut = self.find_cut(worker, currentLoc,
+                                    direction=current_direction,
+                                    tool_rad=tool_radius,
+                                    deg_inc=deg_inc,
+                                    iterations=iterations,
+                                    distance=distance_adjusted,
+                                    lower_bound=lower_bound,
+                                    upper_bound=materialRemovalRatio,
+                                    clockwiseScan=False)
+                if cut is not None:
+                    break
+
+            if cut is None:
+                #print("Failed to find valid cutting move.")
+                break
+
+            (new_loc, current_direction, ratio) = cut
+            worker.make_cut(np.flip(currentLoc), np.flip(new_loc), tool_radius)
+            currentLoc = new_loc
+            toolpath.append((currentLoc + x_y_offset) * self.target_res, height)
+            if ratio < 0.01:
+                emptyCounter += 1
+
+        return current_direction
+
+
+    def load_worker(self, image):
+        '''
+        Returns the job's engagement worker with the given slice loaded.
+        The worker, its context and its programs are only created the
+        first time, every later layer reuses them.
+        '''
+        if self.worker is None:
+            self.worker = self.worker_class(self.target_res, None, self.img_res, self.tool_diam)
+            self.owns_worker = True
+        else:
+            self.worker.set_tool(self.target_res, self.tool_diam)
+
+        self.worker.load_slice(image, self.img_res)
+        return self.worker
+
+    def process_layer(self, image, dist_inc = 2.0, material_removal_ratio = 0.2,
+                      height = 0.0):
+        '''
+        Plans every island of an additive slice that still has stock left
+        and returns the layer's Toolpath. Islands are visited nearest
+        first, see nearest_island, and are planned concurrently when
+        island_processes is above 1, see plan_islands_concurrently.
+        '''
+        tool_radius = self.tool_diam / 2 / self.target_res
+        worker = self.load_worker(image)
+        currentLoc = np.array([0.0, 0.0])
+        islands = [island for island in worker.island_list
+                   if worker.count_pixels(island)[3] > 0]
+
+        if self.island_processes > 1 and len(islands) > 1:
+            toolpath = self.plan_islands_concurrently(worker, image, islands,
+                                                      dist_inc, material_removal_ratio,
+                                                      currentLoc, height)
+        else:
+            toolpath = Toolpath()
+            while islands:
+                current_island = islands.pop(self.nearest_island(worker, islands,
+                                                                 currentLoc))
+                if self.plan_island(worker, toolpath, current_island, tool_radius,
+                                    dist_inc, material_removal_ratio, currentLoc,
+                                    height):
+                    currentLoc = toolpath.last_point() / self.target_res
+
+        self.trace.flush()
+        if len(toolpath) < 1:
+            raise Exception("No paths could be generated for this layer.")
+
+        return toolpath
+
+    def plan_island(self, worker, toolpath, current_island, tool_radius,
+                    dist_inc, material_removal_ratio, start_loc, height = 0.0):
+        '''
+        Clears a single island, linking into it from start_loc, and appends
+        its moves to toolpath. Returns False when no link location of the
+        island could start a cut, leaving toolpath as it was.
+        '''
+        currentLoc = start_loc
+        try:
+            new_direction = self.navigate_link(worker, toolpath, current_island,
+                                               tool_radius, dist_inc,
+                                               material_removal_ratio,
+                                               currentLoc, height)
+        except Exception as error:
+            print(error)
+            return False
+
+        currentLoc = toolpath.last_point() / self.target_res
+        current_direction = new_direction
+
+        #Generate Paths for an additive slice
+        layer_completed = False
+        for i in range(10):
+            if i % 100 == 0:
+                print(f"Link Iteration: {i}")
+            #Initiate Cutting
+            self.cutting_move(worker=worker, toolpath=toolpath,
+                              startLoc=currentLoc,
+                              start_dir=current_direction,
+                              dist_inc=dist_inc,
+                              material_removal_ratio=0.2,
+                              height=height)
+            before_cut_loc = currentLoc
+            print(f"Before Cut Loc: {before_cut_loc * self.target_res}")
+            currentLoc = toolpath.last_point() / self.target_res
+
+            try:
+                current_direction = self.navigate_link(worker, toolpath, current_island,
+                                                       tool_radius, dist_inc,
+                                                       material_removal_ratio,
+                                                       currentLoc, height)
+
+                currentLoc = toolpath.last_point() / self.target_res
+                current_direction = new_direction
+            except Exception as error:
+                print(error)
+                print("Island is complete")
+                print(i)
+                layer_completed = True
+
+
+            if layer_completed:
+                break
+
+        return True
+
+    def nearest_island(self, worker, islands, location):
+        '''
+        Returns the index of the island in islands, entries of the
+        worker's island_list, whose centroid is closest to an (x, y)
+        pixel location. Moving from one island to another always
+        retracts, so going to the closest island left keeps those
+        retracts short.
+        '''
+        centroids = np.array([worker.island_centroids[island[0] - 1]
+                              for island in islands]).reshape(-1, 2)
+        distances = np.linalg.norm(centroids - np.asarray(location), axis=1)
+        return int(np.argmin(distances))
+
+    def group_islands(self, islands):
+        '''
+        Splits islands into groups that can be planned independently of
+        each other. Islands whose bounding boxes, grown by the diameter of
+        the tool, overlap could have material removed by each other's
+        cuts, so they end up in the same group. Returns lists of indices
+        into islands.
+        '''
+        margin = math.ceil(self.tool_diam / self.target_res)
+        boxes = np.array([island[3] for island in islands]).reshape(-1, 4)
+        lower = boxes[:, 0:2] - margin
+        upper = boxes[:, 0:2] + boxes[:, 2:4] + margin
+
+        groups = list(range(len(islands)))
+        def find(index):
+            while groups[index] != index:
+                groups[index] = groups[groups[index]]
+                index = groups[index]
+            return index
+
+        for a in range(len(islands)):
+            overlaps = np.all((lower[a] < upper[a + 1:]) & (lower[a + 1:] < upper[a]), axis=1)
+            for b in np.flatnonzero(overlaps) + a + 1:
+                groups[find(b)] = find(a)
+
+        grouped = {}
+        for index in range(len(islands)):
+            grouped.setdefault(find(index), []).append(index)
+        return list(grouped.values())
+
+    def plan_islands_concurrently(self, worker, image, islands, dist_inc,
+                                  material_removal_ratio, start_loc, height = 0.0):
+        '''
+        Plans islands across island_processes processes, each owning an
+        engine of its own that maps the slice from shared memory. The
+        visiting order is picked up front from the island centroids, and
+        every island links in from the centroid of the island before it.
+        Each group of group_islands is planned by a single process, one
+        island after the other, so no island is planned next to the cuts
+        of an island from another group. The island toolpaths are joined
+        in visiting order, moving into every island after the first with
+        a retract.
+        '''
+        order = []
+        remaining = list(range(len(islands)))
+        location = np.asarray(start_loc)
+        origins = {}
+        while remaining:
+            index = remaining.pop(self.nearest_island(worker, [islands[i] for i in remaining],
+                                                      location))
+            origins[index] = location
+            order.append(index)
+            location = worker.island_centroids[islands[index][0] - 1]
+
+        if self.island_pool is None:
+            numba_threads = max(numba.config.NUMBA_NUM_THREADS // self.island_processes, 1)
+            self.island_pool = ProcessPoolExecutor(max_workers=self.island_processes,
+                                                   mp_context=multiprocessing.get_context("spawn"),
+                                                   initializer=init_island_process,
+                                                   initargs=(self.planner_args(), numba_threads))
+
+        slice_shape = (2, self.img_res[0] * self.img_res[1])
+        memory = shared_memory.SharedMemory(create=True, size=int(np.prod(slice_shape)))
+        try:
+            shared_slice = np.ndarray(slice_shape, dtype='u1', buffer=memory.buf)
+            shared_slice[0] = np.frombuffer(image[0], dtype='u1')
+            shared_slice[1] = np.frombuffer(image[1], dtype='u1')
+            del shared_slice
+
+            futures = []
+            for group in self.group_islands(islands):
+                group = sorted(group, key=order.index)
+                numbers = [islands[index][0] for index in group]
+                group_origins = [np.asarray(origins[index]) for index in group]
+                futures.append(self.island_pool.submit(plan_island_group, memory.name,
+                                                       slice_shape, numbers, group_origins,
+                                                       dist_inc, material_removal_ratio,
+                                                       height))
+
+            island_paths = {}
+            for future in futures:
+                island_paths.update(future.result())
+        finally:
+            memory.close()
+            memory.unlink()
+
+        toolpath = Toolpath()
+        for index in order:
+            island_path = island_paths.get(islands[index][0])
+            if island_path is None:
+                continue
+            toolpath.extend(island_path, RETRACT if len(toolpath) > 0 else None)
+
+        return toolpath
+
+    def navigate_link(self, worker, toolpath, current_island,
+                      tool_radius, dist_inc,
+                      material_removal_ratio,
+                      origin_loc, height = 0.0):
+        link_index = LinkIndex(worker.find_link_coords(current_island))
+        link_coords = link_index.nearest(np.flip(origin_loc)).astype('int32')
+        bool_array = link_coords == np.array([-1, -1])
+        seed_cut_loc = np.array([-1, -1])
+        current_direction = -1.0
+        while not np.any(bool_array):
+            found_direction = False
+            #Determine direction to start in
+            #image = Image.fromarray(link_locations)
+            #image.save(f"./renders/linkData{counter:08d}.png")
+            cut = self.find_cut(worker, np.flip(link_coords),
+                                direction=0.0,
+                                tool_rad=tool_radius,
+                                deg_inc=1.0,
+                                iterations=360,
+                                distance=dist_inc / self.target_res,
+                                lower_bound=0.00001,
+                                upper_bound=material_removal_ratio,
+                                clockwiseScan=False)
+
+            if cut is not None:
+                (seed_cut_loc, current_direction, _ratio) = cut
+                found_direction = True
+
+            if not found_direction:
+                link_index.remove(link_coords)
+                link_coords = link_index.nearest(np.flip(origin_loc)).astype('int32')
+                bool_array = link_coords == np.array([-1, -1])
+                continue
+
+            #Check if chosen link movement needs to retract
+            currentLoc = origin_loc
+            print(f"Target Res: {self.target_res}")
+            print(f"Current Location: {currentLoc * self.target_res}")
+            print(f"Current Link Location: {link_coords * self.target_res}")
+            print(f"Next Seed Coordinate: {seed_cut_loc * self.target_res}")
+            stats = worker.check_cut(np.flip(currentLoc), np.flip(link_coords), tool_radius)
+            currentLoc = np.flip(link_coords)
+            x_y_offset = self.offset[0:2]
+            print(f"Link Stats: {stats}")
+            if stats[0] < 1 and stats[1] < 1 and stats[2] < 1:
+                toolpath.add_chain(LINK, (currentLoc + x_y_offset) * self.target_res, height)
+            else:
+                toolpath.add_chain(RETRACT, (currentLoc + x_y_offset) * self.target_res, height)
+
+            worker.make_cut(np.flip(currentLoc), np.flip(seed_cut_loc), tool_radius)
+            self.trace.capture("link", self.link_count, worker.retrieve_image)
+            self.link_count += 1
+            currentLoc = seed_cut_loc
+            toolpath.add_chain(CUT, (currentLoc + x_y_offset) * self.target_res, height)
+            break
+
+        if np.any(bool_array):
+            self.trace.flush()
+            raise Exception("Cannot Find a new link location.")
+
+        return current_direction
+
+
+#Planner and slices of a layer planning process, see init_layer_process.
+_process_planner = None
+_process_memory = None
+_process_slices = None
+
+def init_layer_process(planner_args, memory_name, slices_shape, numba_threads):
+    '''
+    Sets up a process of Job.generate_paths_parallel. Every process owns
+    a single planner, so an OpenGL engine creates its context once, and
+    maps the slices the job shared instead of receiving copies of them.
+    The cores are split between the processes' Numba kernels, and
+    islands are planned one after the other, since a pool of island
+    processes in every layer process would start processes squared.
+    '''
+    global _process_planner, _process_memory, _process_slices
+    numba.set_num_threads(numba_threads)
+    _process_planner = LayerPlanner(*planner_args)
+    _process_planner.island_processes = 1
+    _process_memory = shared_memory.SharedMemory(name=memory_name)
+    _process_slices = np.ndarray(slices_shape, dtype='u1', buffer=_process_memory.buf)
+
+#Planner and slice of an island planning process, see init_island_process.
+_island_planner = None
+_island_memory = None
+
+def init_island_process(planner_args, numba_threads):
+    '''
+    Sets up a process of LayerPlanner.plan_islands_concurrently, owning
+    a single planner and engine for the life of the pool.
+    '''
+    global _island_planner
+    numba.set_num_threads(numba_threads)
+    _island_planner = LayerPlanner(*planner_args)
+
+def plan_island_group(memory_name, slice_shape, numbers, origins, dist_inc,
+                      material_removal_ratio, height):
+    '''
+    Plans a group of islands, given by their numbers, of the slice shared
+    as memory_name, one after the other on the process' engine. Returns
+    a dictionary of the Toolpath of every island a path was found for.
+    '''
+    global _island_memory
+    planner = _island_planner
+    if _island_memory is None or _island_memory.name != memory_name:
+        if _island_memory is not None:
+            _island_memory.close()
+        _island_memory = shared_memory.SharedMemory(name=memory_name)
+        shared_slice = np.ndarray(slice_shape, dtype='u1', buffer=_island_memory.buf)
+        planner.load_worker((shared_slice[0], shared_slice[1]))
+
+    worker = planner.worker
+    tool_radius = planner.tool_diam / 2 / planner.target_res
+    island_paths = {}
+    for number, origin in zip(numbers, origins):
+        toolpath = Toolpath()
+        if planner.plan_island(worker, toolpath, worker.island_list[number - 1],
+                               tool_radius, dist_inc, material_removal_ratio,
+                               origin, height):
+            island_paths[number] = toolpath
+
+    planner.trace.flush()
+    return island_paths
+
+def plan_layer(index, height, dist_inc, material_removal_ratio):
+    '''
+    Plans the slice at index of the shared slices in a layer planning
+    process and returns its Toolpath.
+    '''
+    images = (_process_slices[index, 0], _process_slices[index, 1])
+    return _process_planner.process_layer(images, dist_inc,
+                                          material_removal_ratio, height)
+
+class Job(LayerPlanner):
     '''
     A class to handle the setup of the rendering of a targetted object
     and generating tool paths when a generator is provided.
@@ -24,22 +740,30 @@ class Job:
 
     def __init__(self, target_model, stock_model, obstacles: list,
                  tool_diam: float, target_res: float = 0.1,
-                 offset_coord = [0, 0, 0], debug = False):
+                 offset_coord = [0, 0, 0], debug = False,
+                 backend = "opengl", search_strategy = "exhaustive",
+                 trace = None, island_processes = 1, ctx = None,
+                 worker = None):
+        super().__init__(tool_diam, target_res, None, offset_coord,
+                         backend, search_strategy, island_processes, trace,
+                         worker)
         self.target_model = target_model
         self.stock_model = stock_model
         self.obstacles = obstacles
-        self.tool_diam = tool_diam
-        self.target_res = target_res
         self.debug = debug
-        self.ctx = moderngl.create_standalone_context()
+        #CPU engines also expand the model edges on the CPU, leaving the
+        #GPU, often a software one on such machines, with less work.
+        self.expand_edges_on_gpu = backend == "opengl"
+        #A context can be handed over to skip creating one for every job.
+        self.ctx = ctx if ctx is not None else moderngl.create_standalone_context()
         self.bounds = self.calculate_bounds()
         self.img_res = self.calculate_resolution(self.bounds)
-        self.offset = np.array(offset_coord)
         
         if self.debug:
             self.api = RenderDocAPI()
 
-        self.setup_opengl_objects()
+        with self.ctx:
+            self.setup_opengl_objects()
         self.d_model = DiscretizedModel(target_res)
 
         self.degree_inc = 2
@@ -51,19 +775,41 @@ class Job:
 
 
     def __del__(self):
-        self.firstPass.release()
-        self.firstPassDepth.release()
-        self.secondPass.release()
-        self.secondPassDepth.release()
-        self.thirdPass.release()
-        self.thirdPassDepth.release()
-        self.vbo_model.release()
-        self.vbo_stock.release()
-        self.color_buffer.release()
-        self.color_stock.release()
-        self.vao1.release()
-        self.vao2.release()
-        self.vao3.release()
+        #Contexts can be handed over and outlive the job, so every object
+        #the job created is released, not only the large ones.
+        with self.ctx:
+            self.fbo_stock.release()
+            self.fbo1.release()
+            self.fbo2.release()
+            self.fbo3.release()
+            self.firstPass.release()
+            self.stockPassDepth.release()
+            self.firstPassDepth.release()
+            self.secondPass.release()
+            self.secondPassDepth.release()
+            self.thirdPass.release()
+            self.thirdPassDepth.release()
+            self.vao_stock.release()
+            self.vao1.release()
+            self.vao2.release()
+            self.vao3.release()
+            self.vao_flood_init.release()
+            self.vao_flood.release()
+            self.vbo_model.release()
+            self.vbo_stock.release()
+            self.image_vbo.release()
+            self.stock_only_buffer.release()
+            for fbo, texture in zip(self.seedFbos, self.seedTextures):
+                fbo.release()
+                texture.release()
+            self.model_render_prog.release()
+            self.edge_detection_prog.release()
+            self.edge_expand_prog.release()
+            self.jump_flood_init_prog.release()
+            self.jump_flood_prog.release()
+            if self.heightfields_rendered:
+                self.release_heightfield_objects()
+        self.release()
         if self.debug:
             self.api.stop_capture()
 
@@ -72,24 +818,15 @@ class Job:
         Calculates the bounding box of the targetted model. Returns a
         tuple of (-x, x, -y, y, -z, z).
         '''
-        rough_bounds = hf.get_model_min_max(self.stock_model)
-        lower_bounds_with_margin = np.floor(rough_bounds[0::2]) - math.ceil(self.tool_diam + 5)
-        higher_bounds_with_margin = np.ceil(rough_bounds[1::2]) + math.ceil(self.tool_diam + 5)
-        return (lower_bounds_with_margin[0], higher_bounds_with_margin[0],
-                lower_bounds_with_margin[1], higher_bounds_with_margin[1],
-                rough_bounds[4], rough_bounds[5])
+        return calculate_bounds(self.stock_model, self.tool_diam)
 
     def calculate_resolution(self, bounds):
         '''
         Determines resolution of the images to be rendered.
         '''
-        res = (math.ceil((bounds[1] - bounds[0]) / self.target_res),
-               math.ceil((bounds[3] - bounds[2]) / self.target_res))
-        max_res = self.ctx.info["GL_MAX_TEXTURE_SIZE"]
-        if res[0] > max_res or res[1] > max_res: #type: ignore
-            raise Exception("Resolution is too high for GPU", res)
-
-        return res
+        with self.ctx:
+            max_res = self.ctx.info["GL_MAX_TEXTURE_SIZE"]
+        return calculate_resolution(bounds, self.target_res, max_res)
 
     def setup_opengl_objects(self):
         '''
@@ -99,8 +836,6 @@ class Job:
         if self.debug:
             self.api.start_capture()
         
-        GL_RGBA2 = 0x8055
-
         self.ctx.enable(moderngl.DEPTH_TEST)
         model_vertex_shader = hf.load_shader("./shaders/v_shader.vert")
         model_frag_shader = hf.load_shader("./shaders/frag_shader.frag")
@@ -111,21 +846,31 @@ class Job:
         image_vertex_shader = hf.load_shader("./shaders/image_shader.vert")
         edge_frag_shader = hf.load_shader("./shaders/image_shader.frag")
 
-        edge_detection_prog = self.ctx.program(vertex_shader=image_vertex_shader,
-                                               fragment_shader=edge_frag_shader)
+        self.edge_detection_prog = self.ctx.program(vertex_shader=image_vertex_shader,
+                                                    fragment_shader=edge_frag_shader)
+        edge_detection_prog = self.edge_detection_prog
 
         edge_expand_frag_shader = hf.load_shader("./shaders/edge_expand.frag")
 
-        edge_expand_prog = self.ctx.program(vertex_shader=image_vertex_shader,
-                                            fragment_shader=edge_expand_frag_shader)
-
-        #Create Textures
-        self.firstPass = self.ctx.texture(self.img_res, 4)
-        stockPassDepth = self.ctx.depth_texture(self.img_res)
+        self.edge_expand_prog = self.ctx.program(vertex_shader=image_vertex_shader,
+                                                 fragment_shader=edge_expand_frag_shader)
+        edge_expand_prog = self.edge_expand_prog
+
+        self.jump_flood_init_prog = self.ctx.program(
+            vertex_shader=image_vertex_shader,
+            fragment_shader=hf.load_shader("./shaders/jump_flood_init.frag"))
+        jump_flood_init_prog = self.jump_flood_init_prog
+        self.jump_flood_prog = self.ctx.program(
+            vertex_shader=image_vertex_shader,
+            fragment_shader=hf.load_shader("./shaders/jump_flood.frag"))
+
+        #Create Textures, every pass holds a single channel of class labels
+        self.firstPass = self.ctx.texture(self.img_res, 1, dtype='u1')
+        self.stockPassDepth = self.ctx.depth_texture(self.img_res)
         self.firstPassDepth = self.ctx.depth_texture(self.img_res)
-        self.secondPass = self.ctx.texture(self.img_res, 4)
+        self.secondPass = self.ctx.texture(self.img_res, 1, dtype='u1')
         self.secondPassDepth = self.ctx.depth_texture(self.img_res)
-        self.thirdPass = self.ctx.texture(self.img_res, 4, dtype='f1', internal_format=GL_RGBA2)
+        self.thirdPass = self.ctx.texture(self.img_res, 1, dtype='u1')
         self.thirdPassDepth = self.ctx.depth_texture(self.img_res)
 
         #print(self.bounds[4], ',', self.bounds[5])
@@ -146,22 +891,21 @@ class Job:
         self.secondPass.use(location=3)
 
         #Calculate cutter radius in pixels for edge expand algorithm
-        edge_expand_prog["cutterRadius"] = (self.tool_diam / 2) / self.target_res
-
-
-        #Get vertice and color data prepared
-        model_size = self.target_model.size
-        stock_size = self.stock_model.size
-        r = np.zeros(model_size)
-        g = np.zeros(model_size)
-        b = np.ones(model_size)
-        a = np.ones(model_size)
-        model_colors = np.dstack([r, g, b, a]).flatten().astype('f4')
-        rStock = np.zeros(stock_size)
-        gStock = np.zeros(stock_size)
-        bStock = np.zeros(stock_size)
-        aStock = np.ones(stock_size)
-        stock_colors = np.dstack([rStock, gStock, bStock, aStock]).flatten().astype('f4')
+        cutter_radius = (self.tool_diam / 2) / self.target_res
+        edge_expand_prog["cutterRadius"] = cutter_radius
+
+        #Seed textures of the jump flood passes, ping-ponged on units 1 and 2.
+        self.seedTextures = [self.ctx.texture(self.img_res, 2, dtype='i2') for i in range(2)]
+        self.seedFbos = [self.ctx.framebuffer([texture]) for texture in self.seedTextures]
+        for location, texture in enumerate(self.seedTextures):
+            texture.use(location=location + 1)
+        jump_flood_init_prog["prev_render"] = 3
+        self.jump_flood_steps = hf.jump_flood_steps(cutter_radius)
+        #The expansion reads the seeds written by the last flood pass.
+        edge_expand_prog["seeds"] = (len(self.jump_flood_steps) % 2) + 1
+
+
+        #Get vertice data prepared
         image_vertices = np.array([
             -1, 1,
             -1, -1,
@@ -171,23 +915,19 @@ class Job:
         model_verts = self.target_model.flatten().astype('f4')
         stock_verts = self.stock_model.flatten().astype('f4')
         #rendered_verts = np.concatenate((model_verts, stock_verts)).astype('f4')
-        #all_colors = np.concatenate((model_colors.flatten(), stock_colors.flatten())).astype('f4')
 
         self.vbo_model = self.ctx.buffer(model_verts)
-        self.color_buffer = self.ctx.buffer(model_colors)
         self.vbo_stock = self.ctx.buffer(stock_verts)
-        self.color_stock = self.ctx.buffer(stock_colors)
         image_vbo = self.ctx.buffer(image_vertices)
+        self.image_vbo = image_vbo
 
         self.vao_stock = self.ctx.vertex_array(self.model_render_prog, [
             (self.vbo_stock, '3f', 'in_vert'),
-            (self.color_stock, '4f', 'in_color'),
         ])
 
         #Create Vertex Array Objects
         self.vao1 = self.ctx.vertex_array(self.model_render_prog, [
             (self.vbo_model, '3f', 'in_vert'),
-            (self.color_buffer, '4f', 'in_color'),
         ])
 
         self.vao2 = self.ctx.vertex_array(edge_detection_prog, [
@@ -198,30 +938,164 @@ class Job:
             (image_vbo, '2f', 'in_position'),
         ])
 
-        buffer_size = self.img_res[0] * self.img_res[1] * 4
+        self.vao_flood_init = self.ctx.vertex_array(jump_flood_init_prog, [
+            (image_vbo, '2f', 'in_position'),
+        ])
+
+        self.vao_flood = self.ctx.vertex_array(self.jump_flood_prog, [
+            (image_vbo, '2f', 'in_position'),
+        ])
+
+        buffer_size = self.img_res[0] * self.img_res[1]
         self.stock_only_buffer = self.ctx.buffer(reserve=buffer_size)
-        self.fbo_stock = self.ctx.framebuffer([self.firstPass], stockPassDepth)
+        self.fbo_stock = self.ctx.framebuffer([self.firstPass], self.stockPassDepth)
         self.fbo1 = self.ctx.framebuffer([self.firstPass], self.firstPassDepth)
         self.fbo2 = self.ctx.framebuffer([self.secondPass], self.secondPassDepth)
         self.fbo3 = self.ctx.framebuffer([self.thirdPass], self.thirdPassDepth)
-        self.fbo1.clear(0.0, 0.0, 0.0, 0.0)
-        self.fbo2.clear(0.0, 0.0, 0.0, 0.0)
-        self.fbo3.clear(0.0, 0.0, 0.0, 0.0)
+        self.fbo1.clear()
+        self.fbo2.clear()
+        self.fbo3.clear()
+        self.heightfields_rendered = False
+
+    def setup_heightfield_objects(self):
+        '''
+        Creates the depth textures, FBOs and the slicing program used to
+        derive every additive slice from a single render of the model
+        and stock heightfields.
+        '''
+        #Heightfields cover everything a layer render could ever see.
+        self.heightfield_top = self.bounds[5] + 1
+        self.heightfield_bottom = self.bounds[4] - 1
+
+        self.model_heightfield = self.ctx.depth_texture(self.img_res)
+        self.stock_heightfield = self.ctx.depth_texture(self.img_res)
+        #Depth values are sampled directly, not compared.
+        self.model_heightfield.compare_func = ''
+        self.stock_heightfield.compare_func = ''
+        self.fbo_model_height = self.ctx.framebuffer(depth_attachment=self.model_heightfield)
+        self.fbo_stock_height = self.ctx.framebuffer(depth_attachment=self.stock_heightfield)
+        #No depth attachment, the slicing pass always covers every pixel.
+        self.fbo_slice = self.ctx.framebuffer([self.firstPass])
+
+        image_vertex_shader = hf.load_shader("./shaders/image_shader.vert")
+        depth_slice_shader = hf.load_shader("./shaders/depth_slice.frag")
+        self.depth_slice_prog = self.ctx.program(vertex_shader=image_vertex_shader,
+                                                 fragment_shader=depth_slice_shader)
+        self.depth_slice_prog["modelDepth"] = 5
+        self.depth_slice_prog["stockDepth"] = 6
+        self.depth_slice_prog["topHeight"] = self.heightfield_top
+        self.depth_slice_prog["bottomHeight"] = self.heightfield_bottom
+        self.model_heightfield.use(location=5)
+        self.stock_heightfield.use(location=6)
+
+        self.vao_slice = self.ctx.vertex_array(self.depth_slice_prog, [
+            (self.image_vbo, '2f', 'in_position'),
+        ])
+
+    def release_heightfield_objects(self):
+        self.vao_slice.release()
+        self.depth_slice_prog.release()
+        self.fbo_slice.release()
+        self.fbo_model_height.release()
+        self.fbo_stock_height.release()
+        self.model_heightfield.release()
+        self.stock_heightfield.release()
+
+    def render_heightfields(self):
+        '''
+        Renders the model and stock once over their whole height, keeping
+        only the depth of their top surfaces.
+        '''
+        self.setup_heightfield_objects()
+        self.model_render_prog["projectionMatrix"].write( #type: ignore
+            glm.ortho(
+                self.bounds[0], self.bounds[1], self.bounds[2], self.bounds[3],
+                -self.heightfield_top, -self.heightfield_bottom
+            )
+        )
+
+        self.fbo_model_height.clear()
+        self.fbo_model_height.use()
+        self.model_render_prog["pixelLabel"] = pl.MODEL
+        self.vao1.render(moderngl.TRIANGLES)
+        self.fbo_stock_height.clear()
+        self.fbo_stock_height.use()
+        self.model_render_prog["pixelLabel"] = pl.STOCK
+        self.vao_stock.render(moderngl.TRIANGLES)
+        self.heightfields_rendered = True
+
+    def render_from_heightfields(self, new_depth, stock_buffer = None):
+        '''
+        Produces the same images as change_ortho_matrix followed by render,
+        by thresholding the heightfields at the layer's height instead of
+        rendering the model and stock again.
+        '''
+        if not self.heightfields_rendered:
+            self.render_heightfields()
+        if stock_buffer is None:
+            stock_buffer = self.stock_only_buffer
+
+        #An engagement engine on the same context binds units of its own.
+        self.model_heightfield.use(location=5)
+        self.stock_heightfield.use(location=6)
+        self.depth_slice_prog["layerHeight"] = self.bounds[5] - new_depth
+        self.fbo_slice.use()
+        self.depth_slice_prog["includeModel"] = False
+        self.vao_slice.render(moderngl.TRIANGLE_STRIP)
+        self.fbo_slice.read_into(stock_buffer, components=1, dtype='u1')
+        self.depth_slice_prog["includeModel"] = True
+        self.vao_slice.render(moderngl.TRIANGLE_STRIP)
+        self.render_edges()
+
+    def render(self, stock_buffer = None):
+        '''
+        Renders the additive slice for the current projection. The stock
+        only image is read into stock_buffer, stock_only_buffer by default.
+        Reads are not waited on, the caller syncs when reading the buffers.
+        '''
+        if stock_buffer is None:
+            stock_buffer = self.stock_only_buffer
 
-    def render(self):
         self.fbo_stock.clear()
         self.fbo_stock.use()
+        self.model_render_prog["pixelLabel"] = pl.STOCK
         self.vao_stock.render(moderngl.TRIANGLES)
-        self.fbo_stock.read_into(self.stock_only_buffer, components=4, dtype='f1')
+        self.fbo_stock.read_into(stock_buffer, components=1, dtype='u1')
         self.fbo1.use()
+        self.model_render_prog["pixelLabel"] = pl.MODEL
         self.vao1.render(moderngl.TRIANGLES)
-        self.fbo2.clear(0.0, 0.0, 0.0, 0.0)
+        self.render_edges()
+
+    def render_edges(self):
+        '''
+        Runs edge detection and edge expansion over the slice in firstPass.
+        The distance to the closest edge pixel comes from jump flooding,
+        taking a logarithmic amount of passes in the cutter radius.
+        The passes bind their textures first, an engagement engine on the
+        same context binds units of its own in between slices.
+        '''
+        self.firstPass.use(location=4)
+        self.secondPass.use(location=3)
+        for location, texture in enumerate(self.seedTextures):
+            texture.use(location=location + 1)
+        self.fbo2.clear()
         self.fbo2.use()
         self.vao2.render(moderngl.TRIANGLE_STRIP)
-        self.fbo3.clear(0.0, 0.0, 0.0, 0.0)
+        if not self.expand_edges_on_gpu:
+            return
+
+        self.seedFbos[0].use()
+        self.vao_flood_init.render(moderngl.TRIANGLE_STRIP)
+        for i, step in enumerate(self.jump_flood_steps):
+            #Pass i reads the seeds of texture unit (i % 2) + 1.
+            self.jump_flood_prog["seeds"] = (i % 2) + 1
+            self.jump_flood_prog["stepSize"] = step
+            self.seedFbos[(i + 1) % 2].use()
+            self.vao_flood.render(moderngl.TRIANGLE_STRIP)
+
+        self.fbo3.clear()
         self.fbo3.use()
         self.vao3.render(moderngl.TRIANGLE_STRIP)
-        self.ctx.finish()
 
     def change_ortho_matrix(self, new_depth):
         self.model_render_prog["projectionMatrix"].write( #type: ignore
@@ -231,22 +1105,30 @@ class Job:
             )
         )
 
-        self.vao1 = self.ctx.vertex_array(self.model_render_prog, [
-            (self.vbo_model, '3f', 'in_vert'),
-            (self.color_buffer, '4f', 'in_color'),
-        ])
-
-    def render_layers(self, depth_of_cut):
+    def render_layers(self, depth_of_cut, from_heightfields = False,
+                      pipeline_depth = 2):
         '''
         Renders the different \'additive slices\' of the model according
         to a given depth of cut. Stops at the bottom of the model.
+        When from_heightfields is set, the model and stock are only
+        rendered once and every slice is derived from their heightfields.
         TODO: Make more flexible by supplying desired final depth.
         '''
+        for images, height in self.iter_layers(depth_of_cut, from_heightfields,
+                                               pipeline_depth):
+            self.d_model.add_layer(images, height)
+
+    def layer_depths(self, depth_of_cut):
+        '''
+        Lists the depth below the top of the stock that every additive
+        slice is rendered at, along with the height it is recorded at.
+        '''
         current_depth = 0.0
         model_depth = np.abs(self.bounds[5] - self.bounds[4])
         stock_top = self.bounds[5]
         print(f"Model Depth:{model_depth}")
 
+        layers = []
         while current_depth <= model_depth:
             current_depth += depth_of_cut
             if np.abs(current_depth - model_depth) < 0.05:
@@ -255,18 +1137,80 @@ class Job:
             if current_depth > model_depth:
                 break
 
-            self.change_ortho_matrix(current_depth)
-            self.render()
-            result_image = self.fbo3.read(components=4, dtype='f1')
-            stock_only = self.stock_only_buffer.read()
-            self.d_model.add_layer((result_image, stock_only), stock_top - current_depth)
+            layers.append((current_depth, stock_top - current_depth))
 
         if current_depth != model_depth:
-            self.change_ortho_matrix(model_depth)
-            self.render()
-            result_image = self.fbo3.read(components=4, dtype='f1')
-            stock_only = self.stock_only_buffer.read()
-            self.d_model.add_layer((result_image, stock_only), stock_top - current_depth)
+            layers.append((model_depth, stock_top - current_depth))
+
+        return layers
+
+    def iter_layers(self, depth_of_cut, from_heightfields = False,
+                    pipeline_depth = 2):
+        '''
+        Renders the additive slices and yields each one as a tuple of its
+        images and height, from the top down. Each layer is read back
+        through its own pixel buffers, so the next layer renders on the
+        GPU while the previous one is handed over. pipeline_depth sets
+        how many layers can be in flight at once.
+
+        Whoever consumes the layers, such as an OpenGL engagement engine,
+        can make another context current in between, so the job's context
+        is entered again for every render and read.
+        '''
+        buffer_size = self.img_res[0] * self.img_res[1]
+        result_fbo = self.fbo3 if self.expand_edges_on_gpu else self.fbo2
+        with self.ctx:
+            slots = [(self.ctx.buffer(reserve=buffer_size), self.ctx.buffer(reserve=buffer_size))
+                     for i in range(pipeline_depth)]
+        pending = []
+
+        try:
+            for i, (depth, height) in enumerate(self.layer_depths(depth_of_cut)):
+                (result_buffer, stock_buffer) = slots[i % pipeline_depth]
+                with self.ctx:
+                    self.render_depth(depth, from_heightfields, stock_buffer)
+                    result_fbo.read_into(result_buffer, components=1, dtype='u1')
+                pending.append((result_buffer, stock_buffer, height))
+
+                if len(pending) >= pipeline_depth:
+                    (result_buffer, stock_buffer, height) = pending.pop(0)
+                    yield self.read_layer(result_buffer, stock_buffer), height
+
+            for (result_buffer, stock_buffer, height) in pending:
+                yield self.read_layer(result_buffer, stock_buffer), height
+        finally:
+            with self.ctx:
+                for result_buffer, stock_buffer in slots:
+                    result_buffer.release()
+                    stock_buffer.release()
+
+    def read_layer(self, result_buffer, stock_buffer):
+        '''
+        Reads a layer's pixel buffers back as its tuple of images,
+        expanding the model edges on the CPU when the GPU did not.
+        '''
+        with self.ctx:
+            result = result_buffer.read()
+            stock = stock_buffer.read()
+        if not self.expand_edges_on_gpu:
+            labels = np.frombuffer(result, dtype='u1')
+            labels = np.reshape(labels, (self.img_res[1], self.img_res[0]))
+            cutter_radius = (self.tool_diam / 2) / self.target_res
+            result = hf.expand_edges(labels, cutter_radius).tobytes()
+
+        return (result, stock)
+
+    def render_depth(self, new_depth, from_heightfields = False, stock_buffer = None):
+        '''
+        Renders the additive slice at the given depth below the top of
+        the stock.
+        '''
+        with self.ctx:
+            if from_heightfields:
+                self.render_from_heightfields(new_depth, stock_buffer)
+            else:
+                self.change_ortho_matrix(new_depth)
+                self.render(stock_buffer)
 
     def save_images(self):
         if not os.path.exists("renders"):
@@ -274,329 +1218,100 @@ class Job:
 
         counter = 0
         for render in self.d_model.images:
-            image = np.frombuffer(render[0], dtype='u1')
-            image = np.reshape(image, (self.img_res[1], self.img_res[0], 4))
-            image = np.flip(image, 0)
+            labels = np.frombuffer(render[0], dtype='u1')
+            labels = np.reshape(labels, (self.img_res[1], self.img_res[0]))
+            image = np.flip(pl.labels_to_rgba(labels), 0)
             image = Image.fromarray(image)
             image.save(f"./renders/layer{counter:04d}.png")
             counter += 1
 
-    def checkCuts(self, cw : ComputeWorker,
-                 coords : np.ndarray,
-                 direction : float,
-                 tool_rad: float,
-                 deg_inc: float,
-                 iterations: int,
-                 distance: float,
-                 clockwiseScan = True):
+    def generate_paths(self, dist_inc = 2.0, material_removal_ratio = 0.2,
+                       processes = 1):
         '''
-        Runs the cut counter compute shader from the given compute worker
-        multiple times, incrememting the the angle of attack multiple
-        times in order to return multiple possible cut results. It can
-        scan in a clockwise direction (the default) or counter clockwise.
-        Must be provided with the current endmill center coordinates
-        and the current direction the end mill is going.
-
-        Degree increment determines how far each iterations is rotated
-        in the determined direction (clockwise or ccw).
+        Plans every rendered layer and returns a list of tuples of each
+        layer's Toolpath and height, from the top down. With more than 1
+        process the layers are planned in parallel, see
+        generate_paths_parallel.
         '''
-
-        if direction >= 360.0 or direction < 0.0:
-            raise Exception(f"direction should be between 0 (inclusive) to 360 (exclusive), not {direction}")
-
-        scan_direction = 1
-        if clockwiseScan == True:
-            scan_direction = -1
-            
-        movement_vector = np.array([1, 0])
-        theta = np.radians((direction) % 360.0)
-        theta_inc = np.radians((deg_inc * scan_direction) % 360.0)
-        c, s = np.cos(theta), np.sin(theta)
-        c_inc, s_inc = np.cos(theta_inc), np.sin(theta_inc)
-
-        initial_rot = np.array(((c, -s), (s, c)))
-        scan_rot_v = np.array(((c_inc, -s_inc), (s_inc, c_inc)))
-
-        test_vectors = np.array([np.dot(initial_rot, movement_vector)])
-        for i in range(iterations - 1):
-            increment = np.array(np.dot(scan_rot_v, test_vectors[-1]))
-            test_vectors = np.append(test_vectors, [increment], axis=0)
-            
-        test_vectors = test_vectors * distance
-        test_vectors = test_vectors + coords
-        cut_stats = []
-        for i in range(iterations):
-            cut_stats.append(cw.check_cut(np.flip(coords), np.flip(test_vectors[i]), tool_rad))
-
-        tested_directions = np.arange(direction, direction + (deg_inc * iterations), (deg_inc * scan_direction))
-        tested_directions = np.mod(tested_directions, 360.0)
-        return [test_vectors, np.array(cut_stats), tested_directions]
-
-    def check_image(self, worker):
-        dtype = np.dtype('u4')
-        uint_counters = np.array([0, 0, 0, 0, 0], dtype=dtype)
-        counter_buffer = self.ctx.buffer(uint_counters, dynamic=True)
-        worker.count_pixels(counter_buffer)
-        count = np.frombuffer(counter_buffer.read(), dtype=np.dtype('u4'))
-        counter_buffer.release()
-
-        return count
-
-    def check_image_masked(self, worker, mask):
-        dtype = np.dtype('u4')
-        uint_counters = np.array([0, 0, 0, 0, 0], dtype=dtype)
-        counter_buffer = self.ctx.buffer(uint_counters, dynamic=True)
-        worker.mask_tex.write(mask)
-        worker.count_pixels(counter_buffer, mask_buffer=True)
-        count = np.frombuffer(counter_buffer.read(), dtype=np.dtype('u4'))
-        counter_buffer.release()
-
-        return count
-
-    def cutting_move(self, worker, startLoc,
-                     start_dir = 0.0, dist_inc = 2.0,
-                     material_removal_ratio = 0.2):
-        distance = dist_inc
-        distance_adjusted = distance / self.target_res
-
-        tool_radius = self.tool_diam / 2 / self.target_res
-        current_direction = start_dir
-        materialRemovalRatio = material_removal_ratio
-        currentLoc = startLoc
-        locations = np.array([currentLoc * self.target_res])
-        emptyCounter = 0
-        easing_factor = 6
-        lower_bound_per = 0.85
-        for i in range(20000):
-            if currentLoc[0] < 0 or currentLoc[0] > self.img_res[0]:
-                print("Outside X Image Bounds")
-                break
-            if currentLoc[1] < 0 or currentLoc[1] > self.img_res[1]:
-                print("Outside Y Image Bounds")
-                break
-
-            image = Image.fromarray(worker.retrieve_image())
-            image.save(f"./renders/testCut{i:08d}.png")
-            x_y_offset = self.offset[0:2]
-
-            #if i % 1000 == 0:
-            #print(f"Iteration: {i}")
-
-            candidates = self.checkCuts(worker, currentLoc,
-                                        direction=current_direction,
-                                        tool_rad=tool_radius,
-                                        deg_inc=0.5,
-                                        iterations=280,
-                                        distance=distance_adjusted,
-                                        clockwiseScan=False)
-
-            madeCut = False
-            easing_iteration = i
-            for i, candidate in enumerate(candidates[1][:, :]):
-                if candidate[0] < 1 and candidate[1] < 1:
-                    ratio = 0.0
-                    if candidate[3] < 1: #If no empty space, ratio is 1.0
-                        ratio = 1.0
-                    else:
-                        ratio = candidate[2] / candidate[3]
-                    lower_bound = (material_removal_ratio * lower_bound_per)
-                    low_bound_mod = (easing_iteration + 0.1) / easing_factor
-                    lower_bound = lower_bound * na.clamp(low_bound_mod, 0.05, 1.0)
-                    if ratio < materialRemovalRatio and ratio > lower_bound:
-                        new_loc = candidates[0][i]
-                        worker.make_cut(np.flip(currentLoc), np.flip(new_loc), tool_radius)
-                        current_direction = candidates[2][i]
-                        currentLoc = new_loc
-                        madeCut = True
-                        locations = np.append(locations, [(currentLoc + x_y_offset) * self.target_res], axis=0)
-                        if ratio < 0.01:
-                            emptyCounter += 1
-                        break
-
-            if not madeCut:
-                candidates = self.checkCuts(worker, currentLoc,
-                                            direction=current_direction,
-                                            tool_rad=tool_radius,
-                                            deg_inc=-0.5,
-                                            iterations=250,
-                                            distance=distance_adjusted,
-                                            clockwiseScan=False)
-
-                for i, candidate in enumerate(candidates[1][:, :]):
-                    #print(f"Candidate {i}: {candidate}")
-                    if candidate[0] < 1 and candidate[1] < 1:
-                        ratio = 0.0
-                        if candidate[3] < 1: #If no empty space, ratio is 1.0
-                            ratio = 1.0
-                        else:
-                            ratio = candidate[2] / candidate[3]
-                        lower_bound = (material_removal_ratio * lower_bound_per)
-                        low_bound_mod = (easing_iteration + 0.1) / easing_factor
-                        lower_bound = lower_bound * na.clamp(low_bound_mod, 0.05, 1.0)
-                        if ratio < materialRemovalRatio and ratio > lower_bound:
-                            new_loc = candidates[0][i]
-                            worker.make_cut(np.flip(currentLoc), np.flip(new_loc), tool_radius)
-                            current_direction = candidates[2][i]
-                            currentLoc = new_loc
-                            madeCut = True
-                            locations = np.append(locations, [(currentLoc + x_y_offset) * self.target_res], axis=0)
-                            if ratio < 0.01:
-                                emptyCounter += 1
-                            break
-
-                if not madeCut:
-                    #print("Failed to find valid cutting move.")
-                    break
-
-        return locations, current_direction
-
-
-    def generate_paths(self, dist_inc = 2.0, material_removal_ratio = 0.2):
         if len(self.d_model.images) < 1:
             print("No images loaded in discrete model.")
             return -1
 
+        if processes > 1:
+            return self.generate_paths_parallel(dist_inc, material_removal_ratio,
+                                                processes)
+
         image_count = len(self.d_model.images)
         depths = self.d_model.heights
         print(depths)
         image = self.d_model.images[image_count - 2]
 
-        locations = []
+        with self.ctx:
+            self.ctx.finish()
+        toolpaths = []
         for i, image in enumerate(self.d_model.images):
-            locations.append((self.process_layer(image, dist_inc,
-                                                 material_removal_ratio),
+            toolpaths.append((self.process_layer(image, dist_inc,
+                                                 material_removal_ratio,
+                                                 depths[i]),
                               depths[i]))
 
+        self.trace.close()
+        return toolpaths
 
-        return locations
-
-
+    def generate_paths_parallel(self, dist_inc = 2.0, material_removal_ratio = 0.2,
+                                processes = None):
+        '''
+        Plans the rendered layers across a pool of processes, each with
+        its own engagement engine, and returns them in the same order as
+        generate_paths. The slices are copied once into shared memory
+        that every process maps, instead of being pickled for each task.
+        Processes are spawned, so none of them inherits the job's OpenGL
+        context. Tracing only covers layers planned by generate_paths.
+        '''
+        if processes is None:
+            processes = os.cpu_count() or 1
 
-    def process_layer(self, image, dist_inc = 2.0, material_removal_ratio = 0.2):
-        tool_radius = self.tool_diam / 2 / self.target_res
-        worker: ComputeWorker = ComputeWorker(self.target_res, image, self.img_res, self.tool_diam)
-        self.ctx.finish()
-        currentLoc = np.array([0.0, 0.0])
-        current_direction = 0.0
-        locations = []
-        current_island = worker.island_list[0][2]
+        depths = self.d_model.heights
+        layer_count = len(self.d_model.images)
+        processes = min(processes, layer_count)
+        numba_threads = max(numba.config.NUMBA_NUM_THREADS // processes, 1)
+        slices_shape = (layer_count, 2, self.img_res[0] * self.img_res[1])
+        memory = shared_memory.SharedMemory(create=True, size=int(np.prod(slices_shape)))
         try:
-            (new_direction, link_locs) = self.navigate_link(worker, current_island,
-                                                                tool_radius, dist_inc,
-                                                                material_removal_ratio,
-                                                                currentLoc)
-        except:
-            raise Exception("No paths could be generated for this layer.")
-
-        for move in link_locs:
-            locations.append(move)
-        
-        currentLoc = locations[-1][-1][-1] / self.target_res
-        current_direction = new_direction
-
-        #Generate Paths for an additive slice
-        layer_completed = False
-        for i in range(10):
-            if i % 100 == 0:
-                print(f"Link Iteration: {i}")
-            #Initiate Cutting
-            cut_moves, _last_dir = self.cutting_move(worker=worker, startLoc=currentLoc, 
-                                                     start_dir=current_direction,
-                                                     dist_inc=dist_inc,
-                                                     material_removal_ratio=0.2)
-            locations.append((0, cut_moves))
-            before_cut_loc = currentLoc
-            print(f"Before Cut Loc: {before_cut_loc * self.target_res}")
-            currentLoc = cut_moves[-1] / self.target_res
-
-            try:
-                (current_direction, link_locs) = self.navigate_link(worker, current_island,
-                                                                    tool_radius, dist_inc,
-                                                                    material_removal_ratio,
-                                                                    currentLoc)
-                for move in link_locs:
-                    locations.append(move)
-
-                currentLoc = locations[-1][-1][-1] / self.target_res
-                current_direction = new_direction
-            except Exception as error:
-                print(error)
-                print("Layer is complete")
-                print(i)
-                layer_completed = True
-
-
-            if layer_completed:
-                break
-
-        return locations
-
-    def navigate_link(self, worker, current_island,
-                      tool_radius, dist_inc,
-                      material_removal_ratio,
-                      origin_loc):
-        link_locations = worker.find_link_locations(current_island).copy()
-        link_coords = na.search_link_points(link_locations, np.flip(origin_loc)).astype('int32')
-        bool_array = link_coords == np.array([-1, -1])
-        seed_cut_loc = np.array([-1, -1])
-        current_direction = -1.0
-        locations = []
-        while not np.any(bool_array):
-            found_direction = False
-            #Determine direction to start in
-            #image = Image.fromarray(link_locations)
-            #image.save(f"./renders/linkData{counter:08d}.png")
-            candidates = self.checkCuts(worker, np.flip(link_coords),
-                                        direction=0.0,
-                                        tool_rad=tool_radius,
-                                        deg_inc=1.0,
-                                        iterations=360,
-                                        distance=dist_inc / self.target_res,
-                                        clockwiseScan=False)
-
-            for i, candidate in enumerate(candidates[1][:, :]):
-                if candidate[0] < 1 and candidate[1] < 1:
-                    ratio = 0.0
-                    if candidate[3] < 1: #If no empty space, ratio is 1.0
-                        ratio = 1.0
-                    else:
-                        ratio = candidate[2] / candidate[3]
-                    if ratio < material_removal_ratio and ratio > 0.00001:
-                        seed_cut_loc = candidates[0][i]
-                        current_direction = candidates[2][i]
-                        found_direction = True
-                        break
-
-            if not found_direction:
-                link_locations[link_coords[0]][link_coords[1]][1] = 0
-                link_locations[link_coords[0]][link_coords[1]][3] = 0
-                link_coords = na.search_link_points(link_locations, origin_loc).astype('int32')
-                bool_array = link_coords == np.array([-1, -1])
-                continue
-
-            #Check if chosen link movement needs to retract
-            currentLoc = origin_loc
-            print(f"Target Res: {self.target_res}")
-            print(f"Current Location: {currentLoc * self.target_res}")
-            print(f"Current Link Location: {link_coords * self.target_res}")
-            print(f"Next Seed Coordinate: {seed_cut_loc * self.target_res}")
-            stats = worker.check_cut(np.flip(currentLoc), np.flip(link_coords), tool_radius)
-            currentLoc = np.flip(link_coords)
-            x_y_offset = self.offset[0:2]
-            print(f"Link Stats: {stats}")
-            if stats[0] < 1 and stats[1] < 1 and stats[2] < 1:
-                locations.append((1, (currentLoc + x_y_offset) * self.target_res))
-            else:
-                locations.append((2, (currentLoc + x_y_offset) * self.target_res))
-
-            worker.make_cut(np.flip(currentLoc), np.flip(seed_cut_loc), tool_radius)
-            img = Image.fromarray(worker.retrieve_image())
-            img.save(f"./renders/beforeException.png")
-            currentLoc = seed_cut_loc
-            locations.append((0, [(currentLoc + x_y_offset) * self.target_res]))
-            break
-
-        if np.any(bool_array):
-            raise Exception("Cannot Find a new link location.")
-
-        return (current_direction, locations)
+            slices = np.ndarray(slices_shape, dtype='u1', buffer=memory.buf)
+            for i, (result, stock) in enumerate(self.d_model.images):
+                slices[i, 0] = np.frombuffer(result, dtype='u1')
+                slices[i, 1] = np.frombuffer(stock, dtype='u1')
+            del slices
+
+            with ProcessPoolExecutor(max_workers=processes,
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=init_layer_process,
+                                     initargs=(self.planner_args(), memory.name,
+                                               slices_shape, numba_threads)) as executor:
+                toolpaths = executor.map(plan_layer, range(layer_count), depths,
+                                         [dist_inc] * layer_count,
+                                         [material_removal_ratio] * layer_count)
+                return [(toolpath, depths[i]) for i, toolpath in enumerate(toolpaths)]
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def iter_paths(self, depth_of_cut, dist_inc = 2.0, material_removal_ratio = 0.2,
+                   from_heightfields = False, pipeline_depth = 2):
+        '''
+        Renders and plans the job as a stream. Each additive slice is
+        planned as soon as iter_layers hands it over, from the top down,
+        and yielded as a tuple of its Toolpath and height while the next
+        slice renders on the GPU. Slices are still added to the
+        discretized model, so save_images works once the stream ends.
+        '''
+        try:
+            for images, height in self.iter_layers(depth_of_cut, from_heightfields,
+                                                   pipeline_depth):
+                self.d_model.add_layer(images, height)
+                yield (self.process_layer(images, dist_inc, material_removal_ratio,
+                                          height),
+                       height)
+        finally:
+            self.trace.close()
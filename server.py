@@ -1,14 +1,17 @@
-import multiprocessing
 import threading
 import socket
+import queue
 import json
+import sys
 import numpy as np
-from job import Job
 
 import Job_Process
 
 HEADERSIZE = 12
 
+#Pool every job is planned by, created when the server starts.
+job_pool = None
+
 
 def handle_connection(connection, client):
     data = b''
@@ -35,26 +38,25 @@ def handle_connection(connection, client):
                 if data["type"] == "message":
                     print(data["contents"])
                 elif data["type"] == "job":
+                    try:
+                        responses = job_pool.submit(data)
+                    except Exception as error:
+                        print(f"Rejected job from {client}: {error}")
+                        responses = queue.Queue()
+                        responses.put({"job_name": data.get("job_name"),
+                                       "error": str(error), "finished": True})
+
+                    #Layers are relayed as the job process plans them.
+                    finished = False
+                    while not finished:
+                        response_data = responses.get(block=True)
+                        finished = response_data.get("finished", True)
+
+                        print(f"Sending paths back to {client}")
+                        response_data = json.dumps(response_data).encode('utf-8')
+                        header_data = bytes(f"{len(response_data):<{HEADERSIZE}}", "utf-8")
+                        connection.sendall(header_data + response_data)
 
-                    to_job_process = multiprocessing.Queue()
-                    from_job_process = multiprocessing.Queue()
-
-                    job_process = multiprocessing.Process(target=Job_Process.new_job_process,
-                                                          args=(to_job_process, from_job_process),
-                                                          daemon=True)
-
-                    job_process.start()
-
-                    to_job_process.put(data)
-                    response_data = from_job_process.get(block=True)
-                    job_process.join()
-                     
-
-                    print(f"Sending paths back to {client}")
-                    response_data = json.dumps(response_data).encode('utf-8')
-                    header_data = bytes(f"{len(response_data):<{HEADERSIZE}}", "utf-8")
-                    connection.sendall(header_data + response_data)
-                    
 
                 new_msg = True
                 data = b''
@@ -63,17 +65,35 @@ def handle_connection(connection, client):
         connection.close()
 ### End Connection Handle Function
 
-tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-server_address = ('', 4320)
-tcp_socket.bind(server_address)
-
-
-tcp_socket.listen(2)
-
-while True:
-    print("Waiting for connection")
-    connection, client = tcp_socket.accept()
-    print("Connected to client IP: {}".format(client))
-    threading.Thread(target=handle_connection, args=(connection, client), daemon=True).start()
-
+if __name__ == "__main__":
+    process_count = 2
+    queue_size = 32
+    gpu_memory = 2048 #MB
+    host_memory = None #MB, half of the physical memory when not given
+    for i, arg in enumerate(sys.argv):
+        if arg == '--workers':
+            process_count = int(sys.argv[i + 1])
+        if arg == '--queue':
+            queue_size = int(sys.argv[i + 1])
+        if arg == '--gpu-memory':
+            gpu_memory = int(sys.argv[i + 1])
+        if arg == '--host-memory':
+            host_memory = int(sys.argv[i + 1])
+
+    job_pool = Job_Process.JobPool(process_count, queue_size,
+                                   gpu_memory * 1024**2,
+                                   host_memory * 1024**2 if host_memory is not None else None)
+
+    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    server_address = ('', 4320)
+    tcp_socket.bind(server_address)
+
+
+    tcp_socket.listen(2)
+
+    while True:
+        print("Waiting for connection")
+        connection, client = tcp_socket.accept()
+        print("Connected to client IP: {}".format(client))
+        threading.Thread(target=handle_connection, args=(connection, client), daemon=True).start()
@@ -1,18 +1,33 @@
 #version 430 core
 
 layout(local_size_x = 16, local_size_y = 16, local_size_z = 1) in;
-layout(rgba32f, binding = 0) uniform image2D imageSlice;
+//Bound to the working slice's unit in the layout, moderngl can not set
+//image uniforms.
+layout(r8ui, binding = 1) uniform readonly uimage2D imageSlice;
 layout(std430, binding = 1) buffer counterBuffer
 {
   uint counters[];
 } cIn;
 uniform vec4 circleCenters;
 uniform float circleRadius;
+uniform ivec2 originOffset = ivec2(0, 0); //Lower left corner of the dispatched region.
 uniform mat4x2 quadPoints;
 uniform ivec4   quadIndices;
 
 uniform bool treatGreenAsRed = false;
 
+//Counters of this workgroup, flushed to the SSBO once at the end so the
+//global counters see one atomic per workgroup instead of one per pixel.
+shared uint localCounters[4];
+
+//GLOBAL_ATOMICS counts every pixel with an atomic on the SSBO instead,
+//as the shader did before, only kept as a baseline for bench_counting.py.
+#ifdef GLOBAL_ATOMICS
+#define COUNT(i) atomicAdd(cIn.counters[i], 1)
+#else
+#define COUNT(i) atomicAdd(localCounters[i], 1)
+#endif
+
 bool isInsideCircle(float radius, vec2 centerCoords, ivec2 pixelCoords) {
     float leftSide = pow(pixelCoords.x - centerCoords.x, 2) +
         pow(pixelCoords.y - centerCoords.y, 2);
@@ -40,13 +55,16 @@ bool isInsideQuad(ivec2 point) {
 }
 
 void main() {
-    ivec2 texelPosition = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 texelPosition = ivec2(gl_GlobalInvocationID.xy) + originOffset;
     ivec2 imageDims = imageSize(imageSlice);
 
-    if(texelPosition.x > (imageDims.x - 1) || texelPosition.y > (imageDims.y - 1)) {
-        return; //Don't go out of image bounds.
+    if (gl_LocalInvocationIndex < 4) {
+        localCounters[gl_LocalInvocationIndex] = 0;
     }
+    barrier();
 
+    //No early returns, every invocation has to reach the barriers.
+    bool insideImage = texelPosition.x < imageDims.x && texelPosition.y < imageDims.y;
 
     bool insideInitCirc = isInsideCircle(circleRadius, circleCenters.xy, texelPosition.yx);
     bool insideDestCirc = isInsideCircle(circleRadius, circleCenters.zw, texelPosition.yx);
@@ -54,24 +72,26 @@ void main() {
 
     bool insideCutRegion = !insideInitCirc && (insideQuad || insideDestCirc);
 
-    if (!insideCutRegion) {
-        return; //No counting if we aren't in the cutting region.
-    }
-
-    vec4 texColor = imageLoad(imageSlice, texelPosition);
-    if (texColor.a >= 0.98) {
-        if (texColor.b >= 0.98) {
-            atomicAdd(cIn.counters[0], 1); //Model Pixel
-        } else if (texColor.r >= 0.98 && texColor.g < 0.9) {
-            atomicAdd(cIn.counters[1], 1); //Obstacle Pixel
-        } else if (treatGreenAsRed && texColor.g > 0.9) {
-            atomicAdd(cIn.counters[1], 1);
+    if (insideImage && insideCutRegion) {
+        uint label = imageLoad(imageSlice, texelPosition).r;
+        if (label == LABEL_EMPTY) {
+            COUNT(3); //Empty Pixel
+        } else if (label == LABEL_MODEL) {
+            COUNT(0); //Model Pixel
+        } else if (label == LABEL_OBSTACLE) {
+            COUNT(1); //Obstacle Pixel
+        } else if (treatGreenAsRed &&
+                   (label == LABEL_MARGIN || label == LABEL_PROFILE || label == LABEL_LINK)) {
+            COUNT(1);
         } else {
-            atomicAdd(cIn.counters[2], 1); //Stock Pixel
+            COUNT(2); //Stock Pixel
         }
-    } else {
-        atomicAdd(cIn.counters[3], 1); //Empty Pixel
     }
+    barrier();
 
-    return;
+#ifndef GLOBAL_ATOMICS
+    if (gl_LocalInvocationIndex < 4 && localCounters[gl_LocalInvocationIndex] > 0) {
+        atomicAdd(cIn.counters[gl_LocalInvocationIndex], localCounters[gl_LocalInvocationIndex]);
+    }
+#endif
 }
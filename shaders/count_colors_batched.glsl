@@ -0,0 +1,110 @@
+#version 430 core
+
+layout(local_size_x = 16, local_size_y = 16, local_size_z = 1) in;
+//Bound to the working slice's unit in the layout, moderngl can not set
+//image uniforms.
+layout(r8ui, binding = 1) uniform readonly uimage2D imageSlice;
+
+//One entry per candidate cut, all sharing the same circle radius.
+struct Candidate {
+    vec4 circleCenters;
+    vec2 quadPoints[4];
+    ivec4 quadIndices;
+};
+
+layout(std430, binding = 3) readonly buffer candidateBuffer
+{
+  Candidate candidates[];
+} cIn;
+layout(std430, binding = 4) buffer batchCounterBuffer
+{
+  uint counters[]; //4 counters per candidate
+} cOut;
+uniform float circleRadius;
+uniform ivec2 originOffset = ivec2(0, 0); //Lower left corner of the dispatched region.
+
+uniform bool treatGreenAsRed = false;
+
+//Counters of this workgroup, every invocation of a workgroup shares the
+//same candidate. Flushed to the SSBO once at the end.
+shared uint localCounters[4];
+
+//GLOBAL_ATOMICS counts every pixel with an atomic on the SSBO instead,
+//only kept as a baseline for bench_counting.py.
+#ifdef GLOBAL_ATOMICS
+#define COUNT(i) atomicAdd(cOut.counters[candidate * 4 + i], 1)
+#else
+#define COUNT(i) atomicAdd(localCounters[i], 1)
+#endif
+
+bool isInsideCircle(float radius, vec2 centerCoords, ivec2 pixelCoords) {
+    float leftSide = pow(pixelCoords.x - centerCoords.x, 2) +
+        pow(pixelCoords.y - centerCoords.y, 2);
+
+    return (leftSide < pow(radius, 2));
+}
+
+bool isInsideQuad(ivec2 point, uint candidate) {
+    int i = 0;
+    while(i < 4) {
+        int trueIndice = cIn.candidates[candidate].quadIndices[i];
+        int nextTrue = cIn.candidates[candidate].quadIndices[(i + 1) % 4];
+        vec2 v1 = cIn.candidates[candidate].quadPoints[trueIndice];
+        vec2 v2 = cIn.candidates[candidate].quadPoints[nextTrue];
+        float d = ((v2.x - v1.x) * (point.y - v1.y)) - ((point.x - v1.x) * (v2.y - v1.y));
+
+        if(d < 0) {
+            return false;
+        }
+
+        i += 1;
+    }
+
+    return true;
+}
+
+void main() {
+    ivec2 texelPosition = ivec2(gl_GlobalInvocationID.xy) + originOffset;
+    uint candidate = gl_GlobalInvocationID.z;
+    ivec2 imageDims = imageSize(imageSlice);
+
+    if (gl_LocalInvocationIndex < 4) {
+        localCounters[gl_LocalInvocationIndex] = 0;
+    }
+    barrier();
+
+    //No early returns, every invocation has to reach the barriers.
+    bool insideImage = texelPosition.x < imageDims.x && texelPosition.y < imageDims.y;
+
+    vec4 circleCenters = cIn.candidates[candidate].circleCenters;
+    bool insideInitCirc = isInsideCircle(circleRadius, circleCenters.xy, texelPosition.yx);
+    bool insideDestCirc = isInsideCircle(circleRadius, circleCenters.zw, texelPosition.yx);
+    bool insideQuad =     isInsideQuad(texelPosition.yx, candidate);
+
+    bool insideCutRegion = !insideInitCirc && (insideQuad || insideDestCirc);
+
+    if (insideImage && insideCutRegion) {
+        uint label = imageLoad(imageSlice, texelPosition).r;
+        if (label == LABEL_EMPTY) {
+            COUNT(3); //Empty Pixel
+        } else if (label == LABEL_MODEL) {
+            COUNT(0); //Model Pixel
+        } else if (label == LABEL_OBSTACLE) {
+            COUNT(1); //Obstacle Pixel
+        } else if (treatGreenAsRed &&
+                   (label == LABEL_MARGIN || label == LABEL_PROFILE || label == LABEL_LINK)) {
+            COUNT(1);
+        } else {
+            COUNT(2); //Stock Pixel
+        }
+    }
+    barrier();
+
+#ifndef GLOBAL_ATOMICS
+    uint base = candidate * 4;
+    if (gl_LocalInvocationIndex < 4 && localCounters[gl_LocalInvocationIndex] > 0) {
+        atomicAdd(cOut.counters[base + gl_LocalInvocationIndex],
+                  localCounters[gl_LocalInvocationIndex]);
+    }
+#endif
+}
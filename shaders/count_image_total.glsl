@@ -1,50 +1,62 @@
 #version 450 core
 
 layout(local_size_x = 16, local_size_y = 16, local_size_z = 1) in;
-layout(binding = 0) uniform sampler2D imageSlice;
+layout(binding = 0) uniform usampler2D imageSlice;
 layout(binding = 2) uniform sampler2D mask;
 layout(std430, binding = 2) buffer counterBuffer
 {
   uint counters[];
 } cIn;
 
-uniform vec4 color1 = vec4(0.0, 0.0, 0.0, 1.0);
-uniform vec4 color2 = vec4(0.0, 0.0, 1.0, 1.0);
-uniform vec4 color3 = vec4(0.0, 1.0, 0.0, 1.0);
 uniform bool useMask = false;
 
+//Counters of this workgroup, flushed to the SSBO once at the end.
+shared uint localCounters[5];
+
+//GLOBAL_ATOMICS counts every pixel with an atomic on the SSBO instead,
+//only kept as a baseline for bench_counting.py.
+#ifdef GLOBAL_ATOMICS
+#define COUNT(i) atomicAdd(cIn.counters[i], 1)
+#else
+#define COUNT(i) atomicAdd(localCounters[i], 1)
+#endif
+
 void main() {
     ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
     ivec2 imageDims = textureSize(imageSlice, 0);
 
-    if (pos.x > (imageDims.x - 1) || pos.y > (imageDims.y - 1)) {
-        return;
+    if (gl_LocalInvocationIndex < 5) {
+        localCounters[gl_LocalInvocationIndex] = 0;
     }
+    barrier();
 
-    if (useMask) {
+    //No early returns, every invocation has to reach the barriers.
+    bool counted = pos.x < imageDims.x && pos.y < imageDims.y;
+
+    if (counted && useMask) {
         vec4 maskValue = texelFetch(mask, pos, 0);
-        if (maskValue.r < 0.9) {
-            return;
-        }
+        counted = maskValue.r >= 0.9;
     }
 
-    vec4 texColor = texelFetch(imageSlice, pos, 0);
-    atomicAdd(cIn.counters[4], 1); //Total Pixels
-
-    if (texColor.a > 0.9) {
-        if (texColor.b > 0.9) {
-            atomicAdd(cIn.counters[0], 1);
-            return;
-        }
-        if (texColor.g > 0.9 && texColor.r < 0.1) {
-            atomicAdd(cIn.counters[1], 1);
-            return;
-        }
-        if (texColor.r > 0.9 && texColor.g < 0.1) {
-            atomicAdd(cIn.counters[2], 1);
-            return;
+    if (counted) {
+        uint label = texelFetch(imageSlice, pos, 0).r;
+        COUNT(4); //Total Pixels
+
+        if (label == LABEL_MODEL) {
+            COUNT(0);
+        } else if (label == LABEL_MARGIN) {
+            COUNT(1);
+        } else if (label == LABEL_OBSTACLE) {
+            COUNT(2);
+        } else if (label != LABEL_EMPTY) {
+            COUNT(3);
         }
+    }
+    barrier();
 
-        atomicAdd(cIn.counters[3], 1);
+#ifndef GLOBAL_ATOMICS
+    if (gl_LocalInvocationIndex < 5 && localCounters[gl_LocalInvocationIndex] > 0) {
+        atomicAdd(cIn.counters[gl_LocalInvocationIndex], localCounters[gl_LocalInvocationIndex]);
     }
+#endif
 }
@@ -0,0 +1,51 @@
+#version 430 core
+
+layout(local_size_x = 16, local_size_y = 16, local_size_z = 1) in;
+layout(r8ui, binding = 1) uniform writeonly uimage2D imageSlice;
+uniform vec4 circleCenters;
+uniform float circleRadius;
+uniform mat4x2 quadPoints;
+uniform ivec4 quadIndices;
+uniform ivec2 originOffset = ivec2(0, 0); //Lower left corner of the dispatched region.
+
+bool isInsideCircle(float radius, vec2 centerCoords, ivec2 pixelCoords) {
+    float leftSide = pow(pixelCoords.x - centerCoords.x, 2) +
+        pow(pixelCoords.y - centerCoords.y, 2);
+
+    return (leftSide < pow(radius, 2));
+}
+
+bool isInsideQuad(ivec2 point) {
+    int i = 0;
+    while(i < 4) {
+        int trueIndice = quadIndices[i];
+        int nextTrue = quadIndices[(i + 1) % 4];
+        vec2 v1 = quadPoints[trueIndice];
+        vec2 v2 = quadPoints[nextTrue];
+        float d = ((v2.x - v1.x) * (point.y - v1.y)) - ((point.x - v1.x) * (v2.y - v1.y));
+
+        if(d < 0) {
+            return false;
+        }
+
+        i += 1;
+    }
+
+    return true;
+}
+
+void main() {
+    ivec2 texelPosition = ivec2(gl_GlobalInvocationID.xy) + originOffset;
+    ivec2 imageDims = imageSize(imageSlice);
+
+    if(texelPosition.x > (imageDims.x - 1) || texelPosition.y > (imageDims.y - 1)) {
+        return; //Don't go out of image bounds.
+    }
+
+    if(isInsideCircle(circleRadius, circleCenters.xy, texelPosition.yx) ||
+       isInsideCircle(circleRadius, circleCenters.zw, texelPosition.yx) ||
+       isInsideQuad(texelPosition.yx)) {
+        //Material inside the cut is removed.
+        imageStore(imageSlice, texelPosition, uvec4(LABEL_EMPTY));
+    }
+}
@@ -0,0 +1,32 @@
+/* # vim: ft=glsl */
+#version 330
+
+uniform sampler2D modelDepth;
+uniform sampler2D stockDepth;
+uniform float topHeight;    //Height at depth 0.0 of the depth textures.
+uniform float bottomHeight; //Height at depth 1.0 of the depth textures.
+uniform float layerHeight;
+uniform bool includeModel = true;
+out uint outLabel;
+
+float depthToHeight(float depth) {
+    return topHeight - depth * (topHeight - bottomHeight);
+}
+
+void main() {
+    ivec2 coords = ivec2(gl_FragCoord.xy);
+    float modelD = texelFetch(modelDepth, coords, 0).r;
+    float stockD = texelFetch(stockDepth, coords, 0).r;
+    uint label = LABEL_EMPTY;
+
+    //A depth of 1.0 is the cleared value, nothing was rendered there.
+    if (stockD < 1.0 && depthToHeight(stockD) >= layerHeight) {
+        label = LABEL_STOCK;
+    }
+
+    if (includeModel && modelD < 1.0 && depthToHeight(modelD) >= layerHeight) {
+        label = LABEL_MODEL;
+    }
+
+    outLabel = label;
+}
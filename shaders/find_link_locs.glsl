@@ -0,0 +1,159 @@
+/* # vim: ft=glsl */
+#version 430 core
+
+//TILE_SIZE and APRON are defined by the host. USE_SHARED_TILE is defined
+//when a tile plus its apron fits in shared memory, otherwise every read
+//goes to the textures.
+layout(local_size_x = TILE_SIZE, local_size_y = TILE_SIZE, local_size_z = 1) in;
+
+layout(binding = 5) uniform usampler2D imageSlice;
+layout(binding = 7) uniform sampler2D mask;
+layout(r8ui, binding = 2) uniform writeonly uimage2D linkImage;
+//Every link location is also appended here as (column << 16) | row.
+layout(std430, binding = 5) buffer linkBuffer
+{
+  uint linkCount;
+  uint linkCoords[];
+} links;
+uniform float circleRadius;
+uniform bool ignoreMargin = true;
+
+#define PROX 1.5
+#define MASK_BIT 8u
+
+bool isInsideCircle(float radius, vec2 centerCoords, ivec2 pixelCoords) {
+    float leftSide = pow(pixelCoords.x - centerCoords.x, 2) +
+        pow(pixelCoords.y - centerCoords.y, 2);
+
+    return (leftSide < pow(radius, 2));
+}
+
+ivec4 getBoundingBox(float radius, ivec2 pixelCoords) {
+    int top = int(ceil(pixelCoords[1] + radius));
+    int bottom = int(floor(pixelCoords[1] - radius));
+    int left = int(floor(pixelCoords[0] - radius));
+    int right = int(ceil(pixelCoords[0] + radius));
+
+    return ivec4(top, bottom, left, right);
+}
+
+//A pixel's label with MASK_BIT set when it is inside of the island mask.
+//Pixels outside of the image are empty.
+uint fetchTexel(ivec2 coords) {
+    if (any(lessThan(coords, ivec2(0))) ||
+        any(greaterThanEqual(coords, textureSize(imageSlice, 0)))) {
+        return LABEL_EMPTY;
+    }
+
+    uint texel = texelFetch(imageSlice, coords, 0).r;
+    if (texelFetch(mask, coords, 0).r > 0.9) {
+        texel |= MASK_BIT;
+    }
+    return texel;
+}
+
+#ifdef USE_SHARED_TILE
+#define TILE_WIDTH (TILE_SIZE + 2 * APRON)
+//Texels of the tile, packed 4 to a uint.
+shared uint tile[(TILE_WIDTH * TILE_WIDTH + 3) / 4];
+
+ivec2 tileOrigin() {
+    return ivec2(gl_WorkGroupID.xy * gl_WorkGroupSize.xy) - APRON;
+}
+
+void loadTile() {
+    uint invocations = gl_WorkGroupSize.x * gl_WorkGroupSize.y;
+    for (uint i = gl_LocalInvocationIndex; i < tile.length(); i += invocations) {
+        tile[i] = 0u;
+    }
+    barrier();
+
+    ivec2 origin = tileOrigin();
+    for (uint i = gl_LocalInvocationIndex; i < TILE_WIDTH * TILE_WIDTH; i += invocations) {
+        ivec2 coords = origin + ivec2(i % TILE_WIDTH, i / TILE_WIDTH);
+        atomicOr(tile[i / 4], fetchTexel(coords) << ((i % 4) * 8));
+    }
+    barrier();
+}
+
+uint tileTexel(ivec2 coords) {
+    ivec2 local = coords - tileOrigin();
+    uint i = uint(local.y * TILE_WIDTH + local.x);
+    return (tile[i / 4] >> ((i % 4) * 8)) & 0xFFu;
+}
+#else
+void loadTile() {}
+
+uint tileTexel(ivec2 coords) {
+    return fetchTexel(coords);
+}
+#endif
+
+void main() {
+    loadTile();
+
+    ivec2 pixelCoords = ivec2(gl_GlobalInvocationID.xy);
+    if (any(greaterThanEqual(pixelCoords, textureSize(imageSlice, 0)))) {
+        return;
+    }
+    uint sliceLabel = tileTexel(pixelCoords) & ~MASK_BIT;
+
+    //Only empty pixels that keep the tool clear of material, but close
+    //enough to touch the island, become link locations.
+    uint tempLabel = LABEL_EMPTY;
+
+    ivec4 boundingBox = getBoundingBox(circleRadius, pixelCoords);
+    bool isDone = false;
+    if (sliceLabel == LABEL_EMPTY) {
+        for(int x = boundingBox[2]; x < boundingBox[3]; x += 1) {
+            for(int y = boundingBox[0]; y > boundingBox[1]; y -= 1) {
+                uint currentPix = tileTexel(ivec2(x, y)) & ~MASK_BIT;
+                ivec2 currentCoords = ivec2(x, y);
+
+                if (isInsideCircle(circleRadius, pixelCoords, currentCoords)
+                    && currentPix != LABEL_EMPTY) {
+
+                    isDone = true;
+                    break;
+                }
+            }
+            if (isDone) {
+                break;
+            }
+        }
+    } else {
+        isDone = true;
+    }
+
+    if (!isDone) {
+        boundingBox = getBoundingBox(circleRadius + PROX, pixelCoords);
+        for(int x = boundingBox[2]; x < boundingBox[3]; x += 1) {
+            for(int y = boundingBox[0]; y > boundingBox[1]; y -= 1) {
+                uint texel = tileTexel(ivec2(x, y));
+                uint currentPix = texel & ~MASK_BIT;
+                ivec2 currentCoords = ivec2(x, y);
+
+                if (isInsideCircle(circleRadius + PROX, pixelCoords, currentCoords) &&
+                    currentPix != LABEL_EMPTY &&
+                    (texel & MASK_BIT) != 0u) {
+
+                    if(ignoreMargin && (currentPix == LABEL_MARGIN ||
+                                        currentPix == LABEL_PROFILE ||
+                                        currentPix == LABEL_LINK)) {
+                        continue;
+                    }
+
+                    tempLabel = LABEL_LINK;
+                    break;
+                }
+
+            }
+        }
+    }
+
+    imageStore(linkImage, pixelCoords, uvec4(tempLabel));
+    if (tempLabel == LABEL_LINK) {
+        uint index = atomicAdd(links.linkCount, 1u);
+        links.linkCoords[index] = uint(pixelCoords.y) | (uint(pixelCoords.x) << 16);
+    }
+}
@@ -1,30 +1,25 @@
 #version 330
 
-uniform sampler2D prev_render;
-out vec4 outColor;
+uniform usampler2D prev_render;
+out uint outLabel;
+
+bool isModel(int x, int y) {
+  return texelFetch(prev_render, ivec2(x, y), 0).r == LABEL_MODEL;
+}
 
 void main() {
-  float xCoord = gl_FragCoord.x;
-  float yCoord = gl_FragCoord.y;
-  vec4 texColor = texelFetch(prev_render, ivec2(xCoord, yCoord), 0);
+  int xCoord = int(gl_FragCoord.x);
+  int yCoord = int(gl_FragCoord.y);
+  uint label = texelFetch(prev_render, ivec2(xCoord, yCoord), 0).r;
 
-  if(texColor.b > 0.95) {
-    if(abs(texelFetch(prev_render, ivec2(xCoord + 1, yCoord), 0).b - texColor.b) > 0.2) {
-      outColor = vec4(1.0, 0.5, 0.0, 1.0);
-    }
-    else if(abs(texelFetch(prev_render, ivec2(xCoord, yCoord + 1), 0).b - texColor.b) > 0.2) {
-      outColor = vec4(1.0, 0.5, 0.0, 1.0);
-    }
-    else if(abs(texelFetch(prev_render, ivec2(xCoord - 1, yCoord), 0).b - texColor.b) > 0.2) {
-      outColor = vec4(1.0, 0.5, 0.0, 1.0);
-    }
-    else if(abs(texelFetch(prev_render, ivec2(xCoord, yCoord - 1), 0).b - texColor.b) > 0.2) {
-      outColor = vec4(1.0, 0.5, 0.0, 1.0);
-    }
-    else {
-      outColor = texColor;
-    }
+  //Model pixels next to anything that is not model are the model's edge.
+  if(label == LABEL_MODEL &&
+     (!isModel(xCoord + 1, yCoord) ||
+      !isModel(xCoord, yCoord + 1) ||
+      !isModel(xCoord - 1, yCoord) ||
+      !isModel(xCoord, yCoord - 1))) {
+    outLabel = LABEL_EDGE;
   } else {
-    outColor = texColor;
+    outLabel = label;
   }
 }
@@ -1,36 +1,19 @@
 /* # vim: ft=glsl */
 #version 330
 
-uniform sampler2D fullRender;
-uniform sampler2D stockOnlyRender;
-uniform vec4 colorTarget = vec4(0.0, 0.0, 0.0, 1.0);
+uniform usampler2D fullRender;
+uniform usampler2D stockOnlyRender;
 
-out vec4 outColor;
-
-bool compareVecs(vec4 vecA, vec4 vecB, float thresh) {
-  vec4 comparator = abs(vecA - vecB);
-  bool withinThresh = true;
-
-  int i = 0;
-  for(i = 0; i < 4; i++) {
-    if (comparator[i] > thresh) {
-      withinThresh = false;
-    }
-  }
-
-  return withinThresh;
-}
+out uint outIsland;
 
 void main() {
   ivec2 coordinates = ivec2(gl_FragCoord.xy);
-  vec4 fullRenderColor = texelFetch(fullRender, coordinates, 0);
-  //vec4 stockRenderColor = texelFetch(stockOnlyRender, coordinates, 0);
-  vec4 newColor = vec4(0.0, 0.0, 1.0, 1.0);
+  uint label = texelFetch(fullRender, coordinates, 0).r;
 
-  if(fullRenderColor.b >= 0.99 || fullRenderColor.r >= 0.99) {
-    newColor = vec4(0.0, 0.0, 0.0, 0.0);
+  //Everything but model, obstacles and profiles can belong to an island.
+  if(label == LABEL_MODEL || label == LABEL_OBSTACLE || label == LABEL_PROFILE) {
+    outIsland = 0u;
+  } else {
+    outIsland = 1u;
   }
-
-  outColor = newColor;
 }
-
@@ -0,0 +1,43 @@
+/* # vim: ft=glsl */
+#version 330
+
+//A single pass of the jump flooding algorithm. Every pixel keeps the
+//closest seed among its own and the ones of the 8 pixels stepSize away.
+uniform isampler2D seeds;
+uniform int stepSize;
+out ivec2 outSeed;
+
+int seedDistance(ivec2 seed, ivec2 coords) {
+    ivec2 d = seed - coords;
+    return d.x * d.x + d.y * d.y;
+}
+
+void main() {
+    ivec2 coords = ivec2(gl_FragCoord.xy);
+    ivec2 imageDims = textureSize(seeds, 0);
+
+    ivec2 bestSeed = ivec2(-1, -1);
+    int bestDistance = 0;
+    for (int i = -1; i <= 1; i += 1) {
+        for (int j = -1; j <= 1; j += 1) {
+            ivec2 sampleCoords = coords + ivec2(i, j) * stepSize;
+            if (any(lessThan(sampleCoords, ivec2(0))) ||
+                any(greaterThanEqual(sampleCoords, imageDims))) {
+                continue;
+            }
+
+            ivec2 seed = texelFetch(seeds, sampleCoords, 0).xy;
+            if (seed.x < 0) {
+                continue;
+            }
+
+            int distance = seedDistance(seed, coords);
+            if (bestSeed.x < 0 || distance < bestDistance) {
+                bestSeed = seed;
+                bestDistance = distance;
+            }
+        }
+    }
+
+    outSeed = bestSeed;
+}
@@ -0,0 +1,17 @@
+/* # vim: ft=glsl */
+#version 330
+
+uniform usampler2D prev_render;
+out ivec2 outSeed;
+
+void main() {
+    ivec2 coords = ivec2(gl_FragCoord.xy);
+    uint label = texelFetch(prev_render, coords, 0).r;
+
+    //Edge pixels are the seeds of the distance field, -1 marks no seed.
+    if (label == LABEL_EDGE) {
+        outSeed = coords;
+    } else {
+        outSeed = ivec2(-1, -1);
+    }
+}
@@ -0,0 +1,155 @@
+/* # vim: ft=glsl */
+#version 430 core
+
+//TILE_SIZE and APRON are defined by the host. USE_SHARED_TILE is defined
+//when a tile plus its apron fits in shared memory, otherwise every read
+//goes to the textures.
+layout(local_size_x = TILE_SIZE, local_size_y = TILE_SIZE, local_size_z = 1) in;
+
+layout(binding = 6) uniform usampler2D slice;
+layout(binding = 4) uniform isampler2D islandLabels; //0 outside of every island.
+layout(r8ui, binding = 3) uniform writeonly uimage2D sliceOut;
+uniform float cutterRadius;
+uniform float spaceAllowance = 1.0;
+
+//Coordinates to scan 8 pixels around a central pixel.
+const ivec2 SCANNER[] = {ivec2(0, 1),  ivec2(1, 1),
+                         ivec2(1, 0),  ivec2(1, -1),
+                         ivec2(0, -1), ivec2(-1, -1),
+                         ivec2(-1, 0), ivec2(-1, 1)};
+
+ivec4 getBoundingBox(float radius, ivec2 pixelCoords) {
+    int top = int(ceil(pixelCoords[1] + radius));
+    int bottom = int(floor(pixelCoords[1] - radius));
+    int left = int(floor(pixelCoords[0] - radius));
+    int right = int(ceil(pixelCoords[0] + radius));
+
+    return ivec4(top, bottom, left, right);
+}
+
+bool isInsideCircle(float radius, ivec2 centerCoords, ivec2 pixelCoords) {
+    float leftSide = pow(pixelCoords[0] - centerCoords[0], 2) +
+        pow(pixelCoords[1] - centerCoords[1], 2);
+
+    return (leftSide < pow(radius, 2));
+}
+
+//Pixels outside of the image are empty.
+uint fetchTexel(ivec2 coords) {
+    if (any(lessThan(coords, ivec2(0))) ||
+        any(greaterThanEqual(coords, textureSize(slice, 0)))) {
+        return LABEL_EMPTY;
+    }
+
+    return texelFetch(slice, coords, 0).r;
+}
+
+#ifdef USE_SHARED_TILE
+#define TILE_WIDTH (TILE_SIZE + 2 * APRON)
+//Texels of the tile, packed 4 to a uint.
+shared uint tile[(TILE_WIDTH * TILE_WIDTH + 3) / 4];
+
+ivec2 tileOrigin() {
+    return ivec2(gl_WorkGroupID.xy * gl_WorkGroupSize.xy) - APRON;
+}
+
+void loadTile() {
+    uint invocations = gl_WorkGroupSize.x * gl_WorkGroupSize.y;
+    for (uint i = gl_LocalInvocationIndex; i < tile.length(); i += invocations) {
+        tile[i] = 0u;
+    }
+    barrier();
+
+    ivec2 origin = tileOrigin();
+    for (uint i = gl_LocalInvocationIndex; i < TILE_WIDTH * TILE_WIDTH; i += invocations) {
+        ivec2 coords = origin + ivec2(i % TILE_WIDTH, i / TILE_WIDTH);
+        atomicOr(tile[i / 4], fetchTexel(coords) << ((i % 4) * 8));
+    }
+    barrier();
+}
+
+uint tileTexel(ivec2 coords) {
+    ivec2 local = coords - tileOrigin();
+    uint i = uint(local.y * TILE_WIDTH + local.x);
+    return (tile[i / 4] >> ((i % 4) * 8)) & 0xFFu;
+}
+#else
+void loadTile() {}
+
+uint tileTexel(ivec2 coords) {
+    return fetchTexel(coords);
+}
+#endif
+
+void main() {
+    loadTile();
+
+    ivec2 coords = ivec2(gl_GlobalInvocationID.xy);
+    if (any(greaterThanEqual(coords, textureSize(slice, 0)))) {
+        return;
+    }
+    uint sliceLabel = tileTexel(coords);
+    uint tempLabel = LABEL_PROFILE;
+    bool isProfile = true;
+
+    int island = texelFetch(islandLabels, coords, 0).r;
+
+    //Not a pixel of any island.
+    if (island == 0) {
+        tempLabel = sliceLabel;
+        isProfile = false;
+    }
+
+    if (sliceLabel == LABEL_EMPTY) {
+        tempLabel = sliceLabel;
+        isProfile = false;
+    }
+
+    int selectedPixel = -1;
+    if (isProfile) {
+        //Determine if there this is an edge pixel.
+        int i = 0;
+        for (i = 0; i < 8; i += 1) {
+            uint sPixel = tileTexel(SCANNER[i] + coords);
+            if (sPixel == LABEL_EMPTY) {
+                selectedPixel = i;
+                break;
+            }
+        }
+    }
+
+    //Return if we are not the edge of the island.
+    if (selectedPixel < 0) {
+        tempLabel = sliceLabel;
+        isProfile = false;
+    }
+
+    if (isProfile) {
+        //Need to make a vector that goes in the direction of the empty pixel
+        vec2 testCoordFloat = vec2(SCANNER[selectedPixel]) * (cutterRadius + spaceAllowance);
+        testCoordFloat = testCoordFloat + vec2(coords);
+        ivec2 testCoord = ivec2(testCoordFloat);
+
+        ivec4 boundingBox = getBoundingBox(cutterRadius + spaceAllowance, testCoord);
+
+        //Search for solid pixels, keep the original label if found.
+        bool stockFound = false;
+        for (int x = boundingBox[2]; x < boundingBox[3]; x += 1) {
+            for (int y = boundingBox[0]; y > boundingBox[1]; y -= 1) {
+                uint current_pix = tileTexel(ivec2(x, y));
+                if (current_pix != LABEL_EMPTY && isInsideCircle(cutterRadius, testCoord, ivec2(x, y))) {
+                    stockFound = true; //We found stock in out circle
+                    break;
+                }
+            }
+            if (stockFound) break;
+        }
+
+        if (stockFound) {
+            tempLabel = sliceLabel;
+            isProfile = false;
+        }
+    }
+
+    imageStore(sliceOut, coords, uvec4(tempLabel));
+}
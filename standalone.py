@@ -5,12 +5,19 @@ import os
 from stl import mesh
 
 from job import Job
+from Trace_Capture import TraceCapture
 import Helper_Functions as hf
 import cProfile
 
 
 
 isDebugModeOn = False
+worker_backend = "opengl"
+slice_from_heightfields = False
+search_strategy = "exhaustive"
+trace_every = 0
+planning_processes = 1
+island_processes = 1
 # Units should be in Metric.
 target_res_per_pixel = 0.2 #Width/Height of each pixel
 
@@ -20,41 +27,67 @@ for arg in sys.argv:
         sys.exit()
     if arg == '--debug' or arg == '-d':
         isDebugModeOn = True
+    if arg == '--cpu':
+        worker_backend = "cpu"
+    if arg == '--bitplane':
+        worker_backend = "bitplane"
+    if arg == '--heightfield':
+        slice_from_heightfields = True
+    if arg == '--bisect':
+        search_strategy = "bisection"
+    if arg == '--trace':
+        trace_every = 50
+    if arg == '--parallel':
+        planning_processes = os.cpu_count() or 1
+    if arg == '--parallel-islands':
+        island_processes = os.cpu_count() or 1
 
-if len(sys.argv) <= 3:
-    print("Please specify an STL file, depth of cut, and tool diameter (in mm).\n")
-    sys.exit()
-
-
-#Load STL File Target Model
-stlTargetModel = os.path.abspath(sys.argv[1])
-model_mesh = mesh.Mesh.from_file(stlTargetModel, speedups=False).vectors
-
-#Load STL File Stock Model
-stlStockModel = os.path.abspath(sys.argv[2])
-stock_mesh = mesh.Mesh.from_file(stlStockModel, speedups=False).vectors
-
-depth_of_cut = float(sys.argv[3])
-tool_diameter = float(sys.argv[4])
-x_coord = float(sys.argv[5])
-y_coord = float(sys.argv[6])
-z_coord = float(sys.argv[7])
-offset_coord = [x_coord, y_coord, z_coord]
-
-newJob = Job(model_mesh, stock_mesh, [],
-             tool_diameter, target_res=target_res_per_pixel,
-             offset_coord=offset_coord,
-             debug=isDebugModeOn)
-
-def generate_paths():
-    newJob.render_layers(depth_of_cut)
-    newJob.save_images()
-    paths = newJob.generate_paths(dist_inc=2.0, material_removal_ratio=0.4)
-    stock_height = newJob.bounds[-1]
-    retract_height = 10 + stock_height
-    hf.gen_test_gcode(paths, retract_height)
-
-if isDebugModeOn:
-    cProfile.run('generate_paths()', filename='stats')
-else:
-    generate_paths()
+if __name__ == "__main__":
+    if len(sys.argv) <= 3:
+        print("Please specify an STL file, depth of cut, and tool diameter (in mm).\n")
+        sys.exit()
+
+
+    #Load STL File Target Model
+    stlTargetModel = os.path.abspath(sys.argv[1])
+    model_mesh = mesh.Mesh.from_file(stlTargetModel, speedups=False).vectors
+
+    #Load STL File Stock Model
+    stlStockModel = os.path.abspath(sys.argv[2])
+    stock_mesh = mesh.Mesh.from_file(stlStockModel, speedups=False).vectors
+
+    depth_of_cut = float(sys.argv[3])
+    tool_diameter = float(sys.argv[4])
+    x_coord = float(sys.argv[5])
+    y_coord = float(sys.argv[6])
+    z_coord = float(sys.argv[7])
+    offset_coord = [x_coord, y_coord, z_coord]
+
+    newJob = Job(model_mesh, stock_mesh, [],
+                 tool_diameter, target_res=target_res_per_pixel,
+                 offset_coord=offset_coord,
+                 debug=isDebugModeOn,
+                 backend=worker_backend,
+                 search_strategy=search_strategy,
+                 trace=TraceCapture(every=trace_every),
+                 island_processes=island_processes)
+
+    def generate_paths():
+        stock_height = newJob.bounds[-1]
+        retract_height = 10 + stock_height
+        if planning_processes > 1:
+            newJob.render_layers(depth_of_cut, from_heightfields=slice_from_heightfields)
+            paths = newJob.generate_paths(dist_inc=2.0, material_removal_ratio=0.4,
+                                          processes=planning_processes)
+        else:
+            #Layers are written out as soon as they are planned.
+            paths = newJob.iter_paths(depth_of_cut, dist_inc=2.0,
+                                      material_removal_ratio=0.4,
+                                      from_heightfields=slice_from_heightfields)
+        hf.gen_test_gcode(paths, retract_height)
+        newJob.save_images()
+
+    if isDebugModeOn:
+        cProfile.run('generate_paths()', filename='stats')
+    else:
+        generate_paths()
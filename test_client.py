@@ -5,9 +5,9 @@ import sys
 import os
 import json
 from stl import mesh
-import numpy as np
 
 import Helper_Functions as hf
+from Toolpath import Toolpath
 
 HEADERSIZE = 12
 
@@ -29,6 +29,45 @@ if len(sys.argv) <= 4:
     print("Please specify an STL file, depth of cut, and tool diameter (in mm).\n")
     sys.exit()
 
+def receive_messages(connection):
+    '''
+    Yields every JSON message the server sends, in order. A chunk can
+    hold the end of a message along with the start of the next one.
+    '''
+    data = b''
+    while True:
+        while len(data) < HEADERSIZE or len(data) - HEADERSIZE < int(data[:HEADERSIZE]):
+            chunk = connection.recv(2048)
+            if chunk == b'':
+                return
+            data += chunk
+
+        msglen = int(data[:HEADERSIZE])
+        print(f"Data Arriving, Length: {msglen}")
+        yield json.loads(data[HEADERSIZE:HEADERSIZE + msglen].decode('utf-8'))
+        data = data[HEADERSIZE + msglen:]
+
+def iter_path_layers(path_message, messages):
+    '''
+    Yields the (Toolpath, height) layers of a job's path messages, from
+    the first one given until the one marked as finished.
+    '''
+    while path_message is not None:
+        if 'error' in path_message:
+            raise Exception(f"Job failed: {path_message['error']}")
+        if 'tool_paths' not in path_message:
+            raise Exception("No paths returned")
+
+        for layer, height in path_message['tool_paths']:
+            print(f"Height: {height}")
+            toolpath = Toolpath.from_dict(layer)
+            print(f"First Move: {toolpath.moves[0] if len(toolpath) else None}")
+            yield toolpath, height
+
+        if path_message.get('finished', True):
+            break
+        path_message = next(messages, None)
+
 tcp_socket = socket.create_connection((ip_address, 4320))
 
 #Load STL File Target Model
@@ -77,60 +116,19 @@ try:
             tcp_socket.sendall(msg_json)
 
             print(f"Waiting for response...")
-            path_data : bytes = b''
-            new_msg = True
-            msglen = 0
-            while True:
-                chunk = tcp_socket.recv(2048)
-
-                if(chunk == b''):
-                    break
-
-                if new_msg:
-                    msglen = int(chunk[:HEADERSIZE])
-                    print(f"Data Arriving, Length: {msglen}")
-                    new_msg = False
-
-                path_data += chunk
-
-                if len(path_data) - HEADERSIZE == msglen:
-                    path_message = json.loads(path_data[HEADERSIZE:].decode('utf-8'))
-                    path_data = []
-                    safe_retract = 0.0
-                    if 'tool_paths' in path_message:
-                        path_data = path_message['tool_paths']
-                    else:
-                        raise Exception(f"No paths returned")
-                    if 'safe_retract' in path_message:
-                        safe_retract = path_message['safe_retract']
-                    else:
-                        raise Exception(f"No retract height returned")
-
-                    finished_paths = []
-                    for layer, height in path_data:
-                        print(f"Height: {height}")
-                        print(f"First Link: {layer[0]}")
-                        layer_chains = []
-                        for path_chain in layer:
-                            match path_chain[0]:
-                                case 0:
-                                    cut_chain = []
-                                    for cut_move in path_chain[1]:
-                                        converted_chain = np.array(cut_move)
-                                        cut_chain.append(converted_chain)
-                                    layer_chains.append((0, cut_chain))
-                                case 1:
-                                    converted_chain = (1, np.array(path_chain[1]))
-                                    layer_chains.append(converted_chain)
-                                case 2:
-                                    converted_chain = (2, np.array(path_chain[1]))
-                                    layer_chains.append(converted_chain)
-                                case _:
-                                    pass
-                        finished_paths.append((layer_chains, height))
-
-                    hf.gen_test_gcode(finished_paths, safe_retract)
-                    break
+            messages = receive_messages(tcp_socket)
+            path_message = next(messages, None)
+            if path_message is None:
+                raise Exception("No paths returned")
+            if 'error' in path_message:
+                raise Exception(f"Job failed: {path_message['error']}")
+            if 'safe_retract' in path_message:
+                safe_retract = path_message['safe_retract']
+            else:
+                raise Exception("No retract height returned")
+
+            #Layers are written to the G-code as they arrive.
+            hf.gen_test_gcode(iter_path_layers(path_message, messages), safe_retract)
 
         else:
             msg = {
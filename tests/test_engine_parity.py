@@ -0,0 +1,115 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import NumbaAccelerated as na
+import Pixel_Labels as pl
+from cpuWorker import CPUWorker
+from bitplaneWorker import BitplaneWorker
+
+IMG_RES = (97, 81)
+RADIUS = 7.5
+DISTANCE = 5.0
+DIRECTIONS = np.arange(0.0, 360.0, 15.0)
+CENTERS = [np.array([40.0, 48.0]), np.array([10.5, 90.25]), np.array([0.0, 0.0])]
+
+def random_slice(seed):
+    '''
+    Returns a slice of random labels as the images every engine loads.
+    '''
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, len(pl.PALETTE), (IMG_RES[1], IMG_RES[0])).astype('u1')
+    return (labels.tobytes(), labels.tobytes())
+
+def count_colors(labels, center1, center2, radius, treat_green_as_red):
+    '''
+    Brute force port of count_colors.glsl, running the shader's tests on
+    every pixel of the slice in single precision.
+    '''
+    quad = na.find_rectangle_points(center1, center2, radius)
+    quad_indices = na.sort_rectangle_verts(quad)
+    (rows, cols) = np.indices(labels.shape)
+    #The shader tests texelPosition.yx, the row comes first.
+    px = rows.astype('f4')
+    py = cols.astype('f4')
+
+    def inside_circle(center):
+        left_side = (px - np.float32(center[0]))**2 + (py - np.float32(center[1]))**2
+        return left_side < np.float32(radius)**2
+
+    inside_quad = np.ones(labels.shape, dtype=bool)
+    for i in range(4):
+        v1 = quad[quad_indices[i]]
+        v2 = quad[quad_indices[(i + 1) % 4]]
+        d = (v2[0] - v1[0]) * (py - v1[1]) - (px - v1[0]) * (v2[1] - v1[1])
+        inside_quad &= d >= 0
+
+    region = labels[~inside_circle(center1) & (inside_quad | inside_circle(center2))]
+    obstacle = region == pl.OBSTACLE
+    if treat_green_as_red:
+        obstacle |= np.isin(region, (pl.MARGIN, pl.PROFILE, pl.LINK))
+    empty = region == pl.EMPTY
+    model = region == pl.MODEL
+    return np.array([np.sum(model), np.sum(obstacle),
+                     np.sum(~(empty | model | obstacle)), np.sum(empty)], dtype='u4')
+
+class ShaderPortParityTest(unittest.TestCase):
+    def check_engine(self, worker_class, treat_green_as_red):
+        images = random_slice(1)
+        worker = worker_class(0.2, images, IMG_RES, 4.0, treat_green_as_red)
+        labels = worker.labels.copy()
+        for center1 in CENTERS:
+            (destinations, counters) = worker.check_cut_fan(center1, DIRECTIONS,
+                                                            DISTANCE, RADIUS)
+            for destination, counter in zip(destinations, counters):
+                expected = count_colors(labels, center1, destination, RADIUS,
+                                        treat_green_as_red)
+                self.assertEqual(counter.tolist(), expected.tolist())
+
+    def test_cpu_worker(self):
+        for treat_green_as_red in (False, True):
+            self.check_engine(CPUWorker, treat_green_as_red)
+
+    def test_bitplane_worker(self):
+        for treat_green_as_red in (False, True):
+            self.check_engine(BitplaneWorker, treat_green_as_red)
+
+class ComputeWorkerParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            from computeWorker import ComputeWorker
+            cls.compute_worker = ComputeWorker(0.2, None, IMG_RES, 4.0)
+        except Exception as error:
+            raise unittest.SkipTest(f"No OpenGL context: {error}")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.compute_worker.release()
+
+    def test_same_results_as_cpu_worker(self):
+        images = random_slice(2)
+        gpu = self.compute_worker
+        gpu.load_slice(images)
+        cpu = CPUWorker(0.2, images, IMG_RES, 4.0)
+
+        for center1 in CENTERS:
+            cpu_cuts = cpu.check_cut_fan(center1, DIRECTIONS, DISTANCE, RADIUS)
+            gpu_cuts = gpu.check_cut_fan(center1, DIRECTIONS, DISTANCE, RADIUS)
+            self.assertEqual(gpu_cuts[1].tolist(), cpu_cuts[1].tolist())
+
+            destination = cpu_cuts[0][0]
+            cpu.make_cut(center1, destination, RADIUS)
+            gpu.make_cut(center1, destination, RADIUS)
+            self.assertTrue(np.array_equal(gpu.retrieve_image(), cpu.retrieve_image()))
+
+        self.assertEqual(gpu.count_pixels().tolist(), cpu.count_pixels().tolist())
+        self.assertEqual(len(gpu.island_list), len(cpu.island_list))
+        for gpu_island, cpu_island in zip(gpu.island_list, cpu.island_list):
+            self.assertEqual(gpu.count_pixels(gpu_island).tolist(),
+                             cpu.count_pixels(cpu_island).tolist())
+
+if __name__ == "__main__":
+    unittest.main()
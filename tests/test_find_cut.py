@@ -0,0 +1,69 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from job import LayerPlanner
+
+LOWER_BOUND = 0.1
+UPPER_BOUND = 0.5
+
+#Cut counters giving a ratio below, inside of and above the band.
+STATE_STATS = {
+    -1: [0, 0, 0, 10],
+    0: [0, 0, 3, 10],
+    1: [0, 0, 10, 10],
+}
+
+class FanWorker:
+    '''
+    Stands in for an engagement engine, answering a fan of cuts with the
+    band state of each direction. Directions are whole degrees, so they
+    double as indices into states.
+    '''
+    def __init__(self, states):
+        self.states = states
+
+    def check_cut_fan(self, center1, directions, distance, radius):
+        indices = np.rint(np.asarray(directions)).astype(int)
+        destinations = np.column_stack((indices, indices)).astype('f8')
+        stats = np.array([STATE_STATS[self.states[i]] for i in indices])
+        return destinations, stats
+
+class FindCutTest(unittest.TestCase):
+    def find_cut(self, states, strategy):
+        planner = LayerPlanner(4.0, 0.2, (16, 16), backend="cpu")
+        return planner.find_cut(FanWorker(states), np.array([0.0, 0.0]),
+                                direction=0.0, tool_rad=1.0, deg_inc=1.0,
+                                iterations=len(states), distance=1.0,
+                                lower_bound=LOWER_BOUND, upper_bound=UPPER_BOUND,
+                                clockwiseScan=False, strategy=strategy)
+
+    def test_bisection_keeps_coarse_sample_in_band(self):
+        #Bisecting towards either side of the in-band sample at 8 runs
+        #into the other transitions at 4 and 9.
+        states = [-1, -1, -1, -1, 1, 1, 1, 1, 0] + [1] * 31
+
+        exhaustive = self.find_cut(states, "exhaustive")
+        bisection = self.find_cut(states, "bisection")
+        self.assertIsNotNone(exhaustive)
+        self.assertIsNotNone(bisection)
+        self.assertEqual(exhaustive[1], 8.0)
+        self.assertEqual(bisection[1], 8.0)
+
+    def test_bisection_finds_band_entry(self):
+        states = [-1] * 13 + [0] * 10 + [1] * 17
+
+        bisection = self.find_cut(states, "bisection")
+        self.assertIsNotNone(bisection)
+        self.assertEqual(bisection[1], 13.0)
+
+    def test_no_cut_in_band(self):
+        states = [-1] * 20 + [1] * 20
+
+        self.assertIsNone(self.find_cut(states, "exhaustive"))
+        self.assertIsNone(self.find_cut(states, "bisection"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geometry_gens import generate_box
+
+STOCK = generate_box((0.0, 20.0, 0.0, 16.0, 0.0, 6.0))
+TARGET = generate_box((6.0, 14.0, 5.0, 11.0, 0.0, 4.0))
+TOOL_DIAM = 2.0
+TARGET_RES = 0.2
+DEPTH_OF_CUT = 2.5
+
+def plan(job, from_heightfields):
+    '''
+    Renders and plans the first two layers of a job, one layer in flight
+    at a time so the second one renders after the first is planned.
+    Returns the rendered slices and the tool paths.
+    '''
+    paths = []
+    for toolpath, height in job.iter_paths(DEPTH_OF_CUT, dist_inc=2.0,
+                                           material_removal_ratio=0.4,
+                                           from_heightfields=from_heightfields,
+                                           pipeline_depth=1):
+        paths.append((toolpath.to_dict(), height))
+        if len(paths) == 2:
+            break
+
+    return job.d_model.images[:2], paths
+
+class SharedContextTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            from computeWorker import ComputeWorker
+            cls.worker = ComputeWorker(TARGET_RES, None, (32, 32), TOOL_DIAM)
+        except Exception as error:
+            raise unittest.SkipTest(f"No OpenGL context: {error}")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.release()
+
+    def test_jobs_on_shared_context(self):
+        from job import Job
+
+        for from_heightfields in (False, True):
+            expected = plan(Job(TARGET, STOCK, [], TOOL_DIAM, target_res=TARGET_RES),
+                            from_heightfields)
+            self.assertEqual(len(expected[1]), 2)
+
+            #Later jobs reuse the worker's textures at the same resolution.
+            for i in range(2):
+                with self.worker.ctx:
+                    job = Job(TARGET, STOCK, [], TOOL_DIAM, target_res=TARGET_RES,
+                              ctx=self.worker.ctx, worker=self.worker)
+                    (images, paths) = plan(job, from_heightfields)
+                    del job
+
+                for image, expected_image in zip(images, expected[0]):
+                    self.assertEqual(image[0], expected_image[0])
+                    self.assertEqual(image[1], expected_image[1])
+                self.assertEqual(paths, expected[1])
+
+if __name__ == "__main__":
+    unittest.main()